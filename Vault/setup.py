@@ -12,5 +12,5 @@ setup(
     author_email="vikas.munshi@gmail.com",
     description="secured secrets",
     packages=['vault', ],
-    install_requires=['pycryptodome>=3.6.1', 'inotify>=0.2.9']
+    install_requires=['pycryptodome>=3.21.0', 'inotify>=0.2.9']
 )
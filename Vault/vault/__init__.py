@@ -5,7 +5,9 @@
 #
 
 from .client_cli import ClientCLI, unlock_device
-from .primitives import decrypt, decrypt_and_encrypt, encrypt, merge, split
+from .primitives import EncryptionSession, decrypt, decrypt_and_encrypt, decrypt_bytes, decrypt_envelope, encrypt, \
+    encrypt_bytes, encrypt_envelope, generate_key, get_key_pool, merge, merge_bytes, rewrap, rewrap_envelope, split, \
+    split_bytes
 from .vault import Agent, Vault
 
 __package__ = 'vault'
@@ -6,8 +6,9 @@
 
 from os.path import dirname, join
 
+from .executors import Executor, rewrap_with
 from .primitives import load_from_file
-from .transport import list_files
+from .transport import list_files, send
 from .vault import Agent, Vault
 
 
@@ -22,13 +23,23 @@ class ClientCLI(Agent):
             share_data = load_from_file(share_file)
             self.load_share_from_transport(share_data)
 
-    def process_requests_from_transport(self) -> None:
-        for request_file in list_files(self.agent_id + '_vault'):
-            request_data = load_from_file(request_file)
-            vault_id = request_data['vault_id']
-            vault_pub_key = request_data['vault_pub_key']
-            secret_id = request_data['secret_id']
-            self.send_share_to_vault(vault_id, vault_pub_key, secret_id)
+    def process_requests_from_transport(self, executor: Executor = None) -> None:
+        """rewrap requested shares for the requesting vaults, in executor (from open_executor) if provided"""
+        requests = [load_from_file(request_file) for request_file in list_files(self.agent_id + '_vault')]
+        if executor is None:
+            for request_data in requests:
+                self.send_share_to_vault(request_data['vault_id'], request_data['vault_pub_key'],
+                                         request_data['secret_id'])
+        else:
+            held = [request_data for request_data in requests if request_data['secret_id'] in self.shares]
+            enc_ys = iter(executor.starmap(rewrap_with, [(self.agent_id, self.shares[request_data['secret_id']]['y'],
+                                                          request_data['vault_pub_key']) for request_data in held]))
+            for request_data in requests:
+                # same empty response as send_share_to_vault for secrets this custodian does not hold
+                share = self.shares.get(request_data['secret_id'])
+                share = {} if share is None else dict(share, y=next(enc_ys))
+                send(sender='{}_{}'.format(request_data['secret_id'], self.agent_id),
+                     receiver=request_data['vault_id'], payload=share)
 
 
 def unlock_device(device: str, inventory_file: str = '/usr/local/bin/Vault/inventory.json') -> str:
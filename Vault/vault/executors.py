@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  vault/executors.py:
+#
+from multiprocessing.pool import Pool, ThreadPool
+from os import cpu_count
+from threading import Thread
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, TypeVar, Union
+
+from .primitives import Key, decrypt_bytes, export_private_key, import_key, rewrap, unpack_share, unpack_y
+
+T = TypeVar('T')
+
+# private keys by key id, imported once per worker by init_worker_keys and used by the *_with task functions
+worker_keys = {}
+
+
+def init_worker_keys(keys: Dict[str, str]) -> None:
+    """import (exported) private keys once per worker instead of pickling them with every task"""
+    worker_keys.update({key_id: import_key(key) for key_id, key in keys.items()})
+
+
+def decrypt_bytes_with(key_id: str, msg: str) -> bytes:
+    return decrypt_bytes(msg, worker_keys[key_id])
+
+
+def rewrap_with(key_id: str, msg: str, public_key: str) -> str:
+    return rewrap(msg, worker_keys[key_id], public_key)
+
+
+def decrypt_share(share: dict, decrypt_func: Callable[[str], bytes]) -> Union[dict, None]:
+    """share with decrypted y and threshold n, or None if the share does not decrypt or unpack"""
+    try:
+        packed_share = decrypt_func(share['y'])
+        n = unpack_share(packed_share)['n'] if share.get('n') is None else share['n']
+        return {'x': share['x'], 'y': unpack_y(packed_share), 'n': n}
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def decrypt_share_with(key_id: str, share: dict) -> Union[dict, None]:
+    return decrypt_share(share, lambda msg: decrypt_bytes(msg, worker_keys[key_id]))
+
+
+class InlineExecutor(object):
+    """runs tasks one after another in the calling thread"""
+
+    def __init__(self, workers: int = None, initializer: Callable[..., None] = None, initargs: Sequence = ()):
+        self.workers = 1
+        if initializer is not None:
+            initializer(*initargs)
+
+    def map(self, func: Callable[[Any], T], iterable: Iterable) -> List[T]:
+        return [func(arg) for arg in iterable]
+
+    def starmap(self, func: Callable[..., T], iterable: Iterable[Sequence]) -> List[T]:
+        return [func(*args) for args in iterable]
+
+    def imap_unordered(self, func: Callable[[Any], T], iterable: Iterable) -> Iterator[T]:
+        """results as tasks complete, consuming iterable lazily"""
+        return (func(arg) for arg in iterable)
+
+    def close(self) -> None:
+        pass
+
+    def terminate(self, wait: bool = True) -> None:
+        """stop without running pending tasks, in the background unless wait"""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class ThreadExecutor(InlineExecutor):
+    """runs tasks in a pool of threads, suited to tasks that release the gil such as io"""
+    pool_class = ThreadPool
+
+    def __init__(self, workers: int = None, initializer: Callable[..., None] = None, initargs: Sequence = ()):
+        self.workers = workers or cpu_count() or 1
+        self.pool = self.pool_class(self.workers, initializer, initargs)
+
+    def map(self, func: Callable[[Any], T], iterable: Iterable) -> List[T]:
+        return self.pool.map(func, iterable)
+
+    def starmap(self, func: Callable[..., T], iterable: Iterable[Sequence]) -> List[T]:
+        return self.pool.starmap(func, iterable)
+
+    def imap_unordered(self, func: Callable[[Any], T], iterable: Iterable) -> Iterator[T]:
+        return self.pool.imap_unordered(func, iterable)
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self, wait: bool = True) -> None:
+        # terminating blocks until the pool has taken its next task, which may be a late share still in transit
+        if wait:
+            self.pool.terminate()
+            self.pool.join()
+        else:
+            Thread(target=self.terminate, daemon=True).start()
+
+
+class ProcessExecutor(ThreadExecutor):
+    """runs tasks in a pool of processes, suited to rsa private key operations and bignum interpolation"""
+    pool_class = Pool
+
+
+executors = {'inline': InlineExecutor, 'thread': ThreadExecutor, 'process': ProcessExecutor}
+Executor = Union[InlineExecutor, ThreadExecutor, ProcessExecutor]
+
+
+def get_executor(kind: str = 'process', workers: int = None, initializer: Callable[..., None] = None,
+                 initargs: Sequence = ()) -> Executor:
+    """executor of kind inline, thread or process"""
+    return executors[kind](workers, initializer, initargs)
+
+
+def get_key_executor(keys: Dict[str, Key], kind: str = 'process', workers: int = None) -> Executor:
+    """executor whose workers hold private keys by key id, for use with decrypt_bytes_with and rewrap_with"""
+    return get_executor(kind, workers, init_worker_keys, ({key_id: export_private_key(key)
+                                                           for key_id, key in keys.items()},))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  vault/metrics.py:
+#
+from json import dumps
+from os import environ
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Union
+
+histogram_buckets = 32  # bucket i counts latencies of less than 2**i microseconds, the last bucket everything slower
+
+
+class NullStage(object):
+    """stage context manager used while metrics are disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+null_stage = NullStage()
+
+
+class Stage(object):
+    """stage context manager recording its latency on exit"""
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.metrics.record(self.name, perf_counter() - self.start)
+
+
+class Metrics(object):
+    """opt-in counts and latency histograms per stage, enabled by enable() or the VAULT_METRICS environment variable"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.lock = Lock()
+        self.stages = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stages.clear()
+
+    def stage(self, name: str) -> Union[Stage, NullStage]:
+        """context manager timing the enclosed block as stage name, a shared no-op while disabled"""
+        return Stage(self, name) if self.enabled else null_stage
+
+    def record(self, name: str, seconds: float) -> None:
+        bucket = min(int(seconds * 1e6).bit_length(), histogram_buckets - 1)
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = [0, 0.0, 0.0, [0] * histogram_buckets]
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], seconds)
+            stage[3][bucket] += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        """count, total, mean and max seconds and non-empty histogram buckets (by upper bound in us) per stage"""
+        with self.lock:
+            stages = {name: (count, total, slowest, list(histogram))
+                      for name, (count, total, slowest, histogram) in self.stages.items()}
+        return {name: {'count': count, 'total_seconds': total, 'mean_seconds': total / count, 'max_seconds': slowest,
+                       'histogram_us': {('<{}'.format(2 ** i) if i < histogram_buckets - 1 else 'slower'): hits
+                                        for i, hits in enumerate(histogram) if hits}}
+                for name, (count, total, slowest, histogram) in sorted(stages.items())}
+
+    def dump(self) -> str:
+        return dumps(self.snapshot(), indent=2)
+
+    def http_get(self, args: list, params: dict, headers: dict) -> dict:
+        """snapshot of all stages, or of stage args[0], when served as a crypt.comm remote object"""
+        snapshot = self.snapshot()
+        return {args[0]: snapshot.get(args[0])} if args else snapshot
+
+    def http_put(self, args: list, params: dict, headers: dict) -> dict:
+        """enable, disable or reset when served as a crypt.comm remote object"""
+        if args and args[0] in ('enable', 'disable', 'reset'):
+            getattr(self, args[0])()
+        return {'enabled': self.enabled}
+
+    getters = []
+    putters = []
+
+
+metrics = Metrics(enabled=bool(environ.get('VAULT_METRICS')))
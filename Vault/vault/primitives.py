@@ -4,46 +4,391 @@
 #  vault/primitives.py:
 #
 from base64 import b64decode, b64encode
-from binascii import hexlify, unhexlify
 from bisect import bisect_left
-from io import BytesIO, TextIOWrapper
+from collections import Counter, OrderedDict, deque
+from io import TextIOWrapper
 from json import load, loads
 from operator import itemgetter
 from random import SystemRandom
 from string import ascii_letters, digits
-from typing import Dict, IO, Sequence, Tuple, Union
+from struct import Struct
+from threading import Condition, Lock, Thread
+from typing import Any, Dict, IO, Sequence, Tuple, Union
 
 from Crypto.Cipher import AES, PKCS1_OAEP
-from Crypto.PublicKey import RSA
+from Crypto.Hash import SHA256
+from Crypto.Protocol.DH import key_agreement
+from Crypto.Protocol.KDF import HKDF
+from Crypto.PublicKey import ECC, RSA
 from Crypto.Random import get_random_bytes
 
+from .arithmetic import decode, evaluate, evaluate_vectors, interpolate, interpolate_vectors, modulo_inverse
+from .metrics import metrics
 
-def decrypt(msg: str, private_key: Union[str, RSA.RsaKey]) -> str:
+# binary envelope: header (magic, version, key type, length of wrapped key), wrapped key, nonce, tag and cipher text
+envelope_header = Struct('>2sBBH')
+envelope_magic = b'CE'
+envelope_version = 1
+key_type_rsa = 0
+key_type_x25519 = 1
+key_types = {'rsa': key_type_rsa, 'x25519': key_type_x25519}
+key_flag_shared = 0x80  # set in the key type of envelopes whose data key is shared by an encryption session
+nonce_size = tag_size = 16
+
+Key = Union[str, RSA.RsaKey, ECC.EccKey]
+
+
+def generate_key(key_type: str = 'rsa') -> Union[RSA.RsaKey, ECC.EccKey]:
+    """new private key, rsa 2048 or x25519"""
+    if key_types[key_type] == key_type_x25519:
+        return ECC.generate(curve='Curve25519')
+    return RSA.generate(2048)
+
+
+def import_key(key: Union[str, bytes]) -> Union[RSA.RsaKey, ECC.EccKey]:
+    """parse exported rsa or x25519 key"""
+    try:
+        return RSA.import_key(key)
+    except ValueError:
+        return ECC.import_key(key)
+
+
+def export_private_key(key: Union[RSA.RsaKey, ECC.EccKey]) -> str:
+    if isinstance(key, RSA.RsaKey):
+        return key.export_key().decode()
+    return key.export_key(format='PEM')
+
+
+def export_public_key(key: Union[RSA.RsaKey, ECC.EccKey]) -> str:
+    """openssh format for rsa keys, pem for x25519 keys (which have no openssh format)"""
+    if isinstance(key, RSA.RsaKey):
+        return key.publickey().export_key(format='OpenSSH').decode()
+    return key.public_key().export_key(format='PEM')
+
+
+class KeyPool(object):
+    """
+    private keys pre-generated by a background thread, refilled up to high watermark whenever fewer than low are left
+    get hands out a pooled key (hit) or generates one synchronously when the pool is empty (miss)
+    """
+
+    def __init__(self, key_type: str = 'rsa', low: int = 2, high: int = 8):
+        self.key_type = key_type
+        self.low = low
+        self.high = max(high, low, 1)
+        self.keys = deque()
+        self.hits = self.misses = 0
+        self.stopped = False
+        self.condition = Condition()
+        self.thread = Thread(target=self.fill, name='key-pool-{}'.format(key_type), daemon=True)
+        self.thread.start()
+
+    def fill(self) -> None:
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.stopped or len(self.keys) < self.low)
+                if self.stopped:
+                    return
+            while not self.stopped and len(self.keys) < self.high:
+                key = generate_key(self.key_type)
+                with self.condition:
+                    self.keys.append(key)
+
+    def get(self) -> Union[RSA.RsaKey, ECC.EccKey]:
+        with self.condition:
+            if self.keys:
+                self.hits += 1
+                key = self.keys.popleft()
+            else:
+                self.misses += 1
+                key = None
+            self.condition.notify()
+        return key if key is not None else generate_key(self.key_type)
+
+    def stats(self) -> Dict[str, int]:
+        with self.condition:
+            return {'hits': self.hits, 'misses': self.misses, 'available': len(self.keys)}
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+
+key_pools = {}
+key_pools_lock = Lock()
+
+
+def get_key_pool(key_type: str = 'rsa', low: int = 2, high: int = 8) -> KeyPool:
+    """shared key pool for key type, started with low and high watermarks on first use"""
+    with key_pools_lock:
+        if key_type not in key_pools:
+            key_pools[key_type] = KeyPool(key_type, low, high)
+        return key_pools[key_type]
+
+
+class X25519Cipher(object):
+    """
+    ecies style data key wrap: ephemeral x25519 key agreement, hkdf sha256 and aes gcm
+    wrapped key is the ephemeral public key, the encrypted data key and the gcm tag
+    """
+    kdf_info = b'x25519 data key wrap'
+
+    def __init__(self, key: ECC.EccKey):
+        self.key = key
+        self.public_bytes = key.public_key().export_key(format='raw')
+
+    def kek(self, shared_secret: bytes, ephemeral_public_bytes: bytes) -> bytes:
+        return HKDF(shared_secret, 32, ephemeral_public_bytes + self.public_bytes, SHA256, context=self.kdf_info)
+
+    def encrypt(self, encryption_key: bytes) -> bytes:
+        ephemeral_key = ECC.generate(curve='Curve25519')
+        ephemeral_public_bytes = ephemeral_key.public_key().export_key(format='raw')
+        kek = key_agreement(static_pub=self.key.public_key(), eph_priv=ephemeral_key,
+                            kdf=lambda shared_secret: self.kek(shared_secret, ephemeral_public_bytes))
+        # every kek is used exactly once, so a constant nonce is safe
+        enc_encryption_key, tag = AES.new(kek, AES.MODE_GCM, nonce=bytes(12)).encrypt_and_digest(encryption_key)
+        return ephemeral_public_bytes + enc_encryption_key + tag
+
+    def decrypt(self, wrapped_key: bytes) -> bytes:
+        ephemeral_public_bytes = bytes(wrapped_key[:32])
+        ephemeral_key = ECC.construct(curve='Curve25519', point_x=int.from_bytes(ephemeral_public_bytes, 'little'))
+        kek = key_agreement(static_priv=self.key, eph_pub=ephemeral_key,
+                            kdf=lambda shared_secret: self.kek(shared_secret, ephemeral_public_bytes))
+        return AES.new(kek, AES.MODE_GCM, nonce=bytes(12)).decrypt_and_verify(wrapped_key[32:-16], wrapped_key[-16:])
+
+
+class KeyRegistry(object):
+    """bounded lru cache of parsed keys, their key type and wrapping cipher objects, keyed by key fingerprint"""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.data_keys = OrderedDict()
+        self.lock = Lock()
+
+    @staticmethod
+    def fingerprint(key: Key) -> bytes:
+        """sha256 of the key modulus, exponent and type or of the x25519 public point if parsed, else of the key"""
+        if isinstance(key, RSA.RsaKey):
+            material = b'%d:%x:%x' % (key.has_private(), key.e, key.n)
+        elif isinstance(key, ECC.EccKey):
+            material = b'%d:x25519:' % key.has_private() + key.public_key().export_key(format='raw')
+        else:
+            material = key.encode() if isinstance(key, str) else key
+        return SHA256.new(material).digest()
+
+    def entry(self, key: Key) -> list:
+        fingerprint = self.fingerprint(key)
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            if entry is not None:
+                self.entries.move_to_end(fingerprint)
+                return entry
+        with metrics.stage('key_import'):
+            parsed_key = key if isinstance(key, (RSA.RsaKey, ECC.EccKey)) else import_key(key)
+        if isinstance(parsed_key, RSA.RsaKey):
+            entry = [parsed_key, PKCS1_OAEP.new(parsed_key), key_type_rsa]
+        else:
+            entry = [parsed_key, X25519Cipher(parsed_key), key_type_x25519]
+        with self.lock:
+            self.entries[fingerprint] = entry
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def get_key(self, key: Key) -> Union[RSA.RsaKey, ECC.EccKey]:
+        """parsed key"""
+        return self.entry(key)[0]
+
+    def get_cipher(self, key: Key) -> Any:
+        """pkcs1 oaep (rsa) or x25519 cipher object wrapping data keys for key"""
+        return self.entry(key)[1]
+
+    def get_key_type(self, key: Key) -> int:
+        return self.entry(key)[2]
+
+    def unwrap(self, private_key: Key, enc_encryption_key: bytes) -> bytes:
+        """decrypt a wrapped data key, reusing the result for messages of the same encryption session"""
+        parsed_key, cipher = self.entry(private_key)[:2]
+        cache_key = self.fingerprint(parsed_key) + enc_encryption_key
+        with self.lock:
+            encryption_key = self.data_keys.get(cache_key)
+            if encryption_key is not None:
+                self.data_keys.move_to_end(cache_key)
+                return encryption_key
+        with metrics.stage('unwrap'):
+            encryption_key = cipher.decrypt(enc_encryption_key)
+        with self.lock:
+            self.data_keys[cache_key] = encryption_key
+            while len(self.data_keys) > self.max_size:
+                self.data_keys.popitem(last=False)
+        return encryption_key
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.data_keys.clear()
+
+
+key_registry = KeyRegistry()
+
+
+def pack_envelope(enc_encryption_key: bytes, nonce: bytes, tag: bytes, cipher_text: bytes,
+                  key_type: int = key_type_rsa) -> bytes:
+    """binary envelope with versioned header"""
+    header = envelope_header.pack(envelope_magic, envelope_version, key_type, len(enc_encryption_key))
+    return b''.join((header, enc_encryption_key, nonce, tag, cipher_text))
+
+
+def unpack_envelope(envelope: bytes, key_size: int) -> Tuple[int, memoryview, memoryview, memoryview, memoryview]:
+    """
+    key type, wrapped key, nonce, tag and cipher text as slices of envelope without copying
+    envelopes without header (wrapped key of key_size bytes, nonce, tag and cipher text) are read as rsa envelopes
+    """
+    view = memoryview(envelope)
+    offset, key_type, wrapped_len = 0, key_type_rsa, key_size
+    if len(view) >= envelope_header.size:
+        magic, version, header_key_type, header_wrapped_len = envelope_header.unpack_from(view)
+        if magic == envelope_magic and version == envelope_version and (header_key_type != key_type_rsa or
+                                                                        header_wrapped_len == key_size):
+            offset, key_type, wrapped_len = envelope_header.size, header_key_type, header_wrapped_len
+    nonce_offset = offset + wrapped_len
+    tag_offset = nonce_offset + nonce_size
+    text_offset = tag_offset + tag_size
+    if len(view) < text_offset:
+        raise ValueError('envelope too short')
+    return (key_type, view[offset:nonce_offset], view[nonce_offset:tag_offset], view[tag_offset:text_offset],
+            view[text_offset:])
+
+
+def shares_data_key(envelope: bytes) -> bool:
+    """true for envelopes of an encryption session, whose data key also protects other messages"""
+    return (len(envelope) >= envelope_header.size and envelope[:2] == envelope_magic and
+            envelope[2] == envelope_version and bool(envelope[3] & key_flag_shared))
+
+
+def unwrap_envelope(envelope: bytes, private_key: Key) -> Tuple[bytes, memoryview, memoryview, memoryview]:
+    """data key, nonce, tag and cipher text of binary envelope"""
+    parsed_key, _, private_key_type = key_registry.entry(private_key)
+    key_size = parsed_key.size_in_bytes() if private_key_type == key_type_rsa else 0
+    key_type, enc_encryption_key, nonce, tag, cipher_text = unpack_envelope(envelope, key_size)
+    if key_type & ~key_flag_shared != private_key_type:
+        raise ValueError('envelope key type {} does not match private key type {}'.format(key_type, private_key_type))
+    return key_registry.unwrap(parsed_key, enc_encryption_key), nonce, tag, cipher_text
+
+
+def decrypt_envelope(envelope: bytes, private_key: Key) -> bytes:
+    """decrypt binary envelope using private key"""
+    encryption_key, nonce, tag, cipher_text = unwrap_envelope(envelope, private_key)
+    with metrics.stage('aes_decrypt'):
+        cipher_aes = AES.new(encryption_key, AES.MODE_EAX, nonce)
+        return cipher_aes.decrypt_and_verify(cipher_text, tag)
+
+
+def encrypt_envelope(msg: bytes, public_key: Key) -> bytes:
+    """encrypt msg using public key into binary envelope"""
+    _, cipher, key_type = key_registry.entry(public_key)
+    encryption_key = get_random_bytes(32)
+    with metrics.stage('aes_encrypt'):
+        cipher_aes = AES.new(encryption_key, AES.MODE_EAX)
+        cipher_text, tag = cipher_aes.encrypt_and_digest(msg)
+    with metrics.stage('wrap'):
+        enc_encryption_key = cipher.encrypt(encryption_key)
+    return pack_envelope(enc_encryption_key, cipher_aes.nonce, tag, cipher_text, key_type)
+
+
+def decrypt_bytes(msg: str, private_key: Key) -> bytes:
+    """decrypt (encrypted, base64 encoded) msg using private key"""
+    with metrics.stage('decrypt'):
+        with metrics.stage('base64_decode'):
+            envelope = b64decode(msg)
+        return decrypt_envelope(envelope, private_key)
+
+
+def encrypt_bytes(msg: bytes, public_key: Key) -> str:
+    """encrypt msg using public key, base64 encoded"""
+    with metrics.stage('encrypt'):
+        envelope = encrypt_envelope(msg, public_key)
+        with metrics.stage('base64_encode'):
+            return b64encode(envelope).decode()
+
+
+def rewrap_envelope(envelope: bytes, private_key: Key, public_key: Key) -> bytes:
+    """
+    rewrap the data key of binary envelope for public key, leaving nonce, tag and cipher text untouched
+    envelopes of an encryption session are decrypted and encrypted under a fresh data key instead, as their data key
+    also protects the other messages of the session
+    """
+    if shares_data_key(envelope):
+        return encrypt_envelope(decrypt_envelope(envelope, private_key), public_key)
+    encryption_key, nonce, tag, cipher_text = unwrap_envelope(envelope, private_key)
+    _, cipher, key_type = key_registry.entry(public_key)
+    with metrics.stage('wrap'):
+        enc_encryption_key = cipher.encrypt(encryption_key)
+    return pack_envelope(enc_encryption_key, nonce, tag, cipher_text, key_type)
+
+
+def rewrap(msg: str, private_key: Key, public_key: Key) -> str:
+    """rewrap (encrypted, base64 encoded) msg for public key without decrypting its cipher text"""
+    with metrics.stage('rewrap'):
+        with metrics.stage('base64_decode'):
+            envelope = b64decode(msg)
+        envelope = rewrap_envelope(envelope, private_key, public_key)
+        with metrics.stage('base64_encode'):
+            return b64encode(envelope).decode()
+
+
+class EncryptionSession(object):
+    """
+    one wrapped data key per (sender, recipient, batch), each message encrypted with a fresh aes nonce
+    messages can be decrypted with decrypt_bytes, their envelopes are flagged as sharing the data key
+    """
+
+    def __init__(self, public_key: Key):
+        _, cipher, self.key_type = key_registry.entry(public_key)
+        self.encryption_key = get_random_bytes(32)
+        with metrics.stage('wrap'):
+            self.enc_encryption_key = cipher.encrypt(self.encryption_key)
+
+    def encrypt_envelope(self, msg: bytes) -> bytes:
+        """encrypt msg with the session data key into binary envelope"""
+        with metrics.stage('aes_encrypt'):
+            cipher_aes = AES.new(self.encryption_key, AES.MODE_EAX)
+            cipher_text, tag = cipher_aes.encrypt_and_digest(msg)
+        return pack_envelope(self.enc_encryption_key, cipher_aes.nonce, tag, cipher_text,
+                             self.key_type | key_flag_shared)
+
+    def encrypt_bytes(self, msg: bytes) -> str:
+        """encrypt msg with the session data key, base64 encoded"""
+        with metrics.stage('encrypt'):
+            envelope = self.encrypt_envelope(msg)
+            with metrics.stage('base64_encode'):
+                return b64encode(envelope).decode()
+
+    def encrypt(self, msg: str) -> str:
+        return self.encrypt_bytes(msg.encode())
+
+
+def decrypt(msg: str, private_key: Key) -> str:
     """decrypt (encrypted) msg using private key"""
-    rsa_key = private_key if isinstance(private_key, RSA.RsaKey) else RSA.import_key(private_key)
-    key_size = rsa_key.size_in_bytes()
-    enc_msg = BytesIO(b64decode(msg.encode()))
-    enc_encryption_key, nonce, tag, cipher_text = [enc_msg.read(size) for size in (key_size, 16, 16, -1)]
-    encryption_key = PKCS1_OAEP.new(rsa_key).decrypt(enc_encryption_key)
-    cipher_aes = AES.new(encryption_key, AES.MODE_EAX, nonce)
-    return cipher_aes.decrypt_and_verify(cipher_text, tag).decode()
+    return decrypt_bytes(msg, private_key).decode()
 
 
-def encrypt(msg: str, public_key: Union[str, RSA.RsaKey]) -> str:
+def encrypt(msg: str, public_key: Key) -> str:
     """encrypt msg using public key"""
-    encryption_key = get_random_bytes(32)
-    rsa_key = public_key if isinstance(public_key, RSA.RsaKey) else RSA.import_key(public_key)
-    enc_encryption_key = PKCS1_OAEP.new(rsa_key).encrypt(encryption_key)
-    cipher_aes = AES.new(encryption_key, AES.MODE_EAX)
-    cipher_text, tag = cipher_aes.encrypt_and_digest(msg.encode())
-    return b64encode(enc_encryption_key + cipher_aes.nonce + tag + cipher_text).decode()
+    return encrypt_bytes(msg.encode(), public_key)
 
 
-def decrypt_and_encrypt(enc_msg: str, private_key: Union[str, RSA.RsaKey], public_key: Union[str, RSA.RsaKey]) -> str:
-    """decrypt (encrypted) msg and (re)encrypt using public key"""
-    decryption_private_key = private_key if isinstance(private_key, RSA.RsaKey) else RSA.import_key(private_key)
-    encryption_public_key = public_key if isinstance(public_key, RSA.RsaKey) else RSA.import_key(public_key)
-    return encrypt(msg=decrypt(msg=enc_msg, private_key=decryption_private_key), public_key=encryption_public_key)
+def decrypt_and_encrypt(enc_msg: str, private_key: Key, public_key: Key, session: EncryptionSession = None) -> str:
+    """
+    rewrap (encrypted) msg for public key, or decrypt and (re)encrypt using session for public key if provided
+    the recipient never learns the data key of another msg, see rewrap_envelope
+    """
+    with metrics.stage('decrypt_and_encrypt'):
+        if session is not None:
+            return session.encrypt_bytes(decrypt_bytes(msg=enc_msg, private_key=private_key))
+        return rewrap(msg=enc_msg, private_key=private_key, public_key=public_key)
 
 
 # pre-calculated list of (mersenne) primes 6972593, 13466917, 20996011, 24036583, 25964951, 30402457, 32582657, 37156667
@@ -54,36 +399,96 @@ primes = [(2 ** e) - 1 for e in (1279, 2203, 2281, 3217, 4253, 4423, 9689, 9941,
 rand = SystemRandom()
 
 
+# secrets longer than chunked_threshold bytes are split chunk by chunk over the fixed field chunk_prime
+chunk_size = 64
+chunk_prime = (2 ** 521) - 1
+chunked_threshold = 1024
+
+
+def bytes_to_chunks(bytes_arg: bytes) -> Tuple[int, ...]:
+    """map bytes, padded to a multiple of chunk_size, to a vector of ints in field chunk_prime"""
+    bytes_arg += b'\x80' + bytes(-(len(bytes_arg) + 1) % chunk_size)
+    return tuple(int.from_bytes(bytes_arg[i:i + chunk_size], 'big') for i in range(0, len(bytes_arg), chunk_size))
+
+
+def chunks_to_bytes(chunks: Sequence[int]) -> bytes:
+    """reverse map vector of ints to bytes"""
+    bytes_arg = b''.join(chunk.to_bytes(chunk_size, 'big') for chunk in chunks)
+    return bytes_arg[:bytes_arg.rindex(b'\x80')]
+
+
+# packed shares are a header (magic, x, n, m, field id, number and byte width of y elements) and big-endian y elements
+# the field id tells chunked vectors over chunk_prime from single ints, whose prime merge finds from the y values
+share_struct = Struct('>2sIHHBII')
+share_magic = b'\x00S'
+int_field_id = 0
+chunk_field_id = 255
+
+
+def pack_share(x: int, y: Union[int, Sequence[int]], n: int, m: int) -> bytes:
+    """pack share in length-prefixed binary format"""
+    chunked = isinstance(y, (tuple, list))
+    y_vals = tuple(y) if chunked else (y,)
+    width = max((y_i.bit_length() + 7) // 8 for y_i in y_vals)
+    return share_struct.pack(share_magic, x, n, m, chunk_field_id if chunked else int_field_id, len(y_vals), width) + \
+        b''.join(y_i.to_bytes(width, 'big') for y_i in y_vals)
+
+
+def unpack_share(bytes_arg: bytes) -> Dict:
+    """unpack share from length-prefixed binary format"""
+    magic, x, n, m, field_id, count, width = share_struct.unpack_from(bytes_arg)
+    if magic != share_magic or len(bytes_arg) != share_struct.size + count * width:
+        raise ValueError('not a packed share')
+    view = memoryview(bytes_arg)[share_struct.size:]
+    y_vals = tuple(int.from_bytes(view[i * width:(i + 1) * width], 'big') for i in range(count))
+    return {'x': x, 'y': y_vals if field_id == chunk_field_id else y_vals[0], 'n': n, 'm': m}
+
+
+def unpack_y(bytes_arg: bytes) -> Union[int, Tuple[int, ...]]:
+    """share y value from packed share, or from the decimal str of shares encrypted before the binary format"""
+    if bytes_arg[:len(share_magic)] == share_magic:
+        return unpack_share(bytes_arg)['y']
+    str_arg = bytes_arg.decode()
+    return tuple(int(y_i) for y_i in str_arg.split(',')) if ',' in str_arg else int(str_arg)
+
+
+def bytes_to_int(bytes_arg: bytes) -> int:
+    """map bytes to int, framed with a leading 0x01 byte so that leading zero bytes survive"""
+    return int.from_bytes(b'\x01' + bytes_arg, 'big')
+
+
+def int_to_bytes(int_arg: int) -> bytes:
+    """reverse map int to bytes"""
+    bytes_arg = int_arg.to_bytes((int_arg.bit_length() + 7) // 8, 'big')
+    if bytes_arg[:1] != b'\x01':
+        raise ValueError('int is not framed bytes')
+    return bytes_arg[1:]
+
+
 def str_to_int(str_arg: str) -> int:
     """map string to int"""
-    return int(hexlify(str_arg.encode('utf-8')), 16)
+    return int.from_bytes(str_arg.encode('utf-8'), 'big')
 
 
 def int_to_str(int_arg: int) -> str:
     """reverse map int to string"""
-    return unhexlify(format(int_arg, 'x')).decode('utf-8')
+    return int_arg.to_bytes((int_arg.bit_length() + 7) // 8, 'big').decode('utf-8')
 
 
-def egcd(a: int, b: int) -> Tuple[int, int, int]:
-    """Euler's extended algorithm for GCD"""
-    if a == 0:
-        return b, 0, 1
-    else:
-        g, y, x = egcd(b % a, a)
-        return g, x - (b // a) * y, y
-
-
-def modulo_inverse(x: int, n: int) -> int:
-    """multiplicative inverse of x in modulo group n"""
-    return (n + egcd(n, abs(x % n))[2]) % n
+def secret_to_str(secret: Union[int, bytes]) -> str:
+    """decode merged secret, ints that are not framed bytes are unframed strings split by earlier versions"""
+    if isinstance(secret, bytes):
+        return secret.decode('utf-8')
+    try:
+        secret = int_to_bytes(secret)
+    except ValueError:
+        return int_to_str(secret)
+    return secret.decode('utf-8')
 
 
 def polynomial(x: int, coefficients: Sequence[int], n: int) -> int:
     """value at x of polynomial with given coefficients in modulo field n"""
-    y = 0
-    for i, a in enumerate(coefficients):
-        y = (y + (a * (x ** i) % n) % n) % n
-    return y
+    return evaluate(coefficients, (x,), n)[0]
 
 
 def get_random_str(length: int = 32) -> str:
@@ -98,37 +503,107 @@ class Share(dict):
         super().__init__(x=x, y=y)
 
 
+def get_x_vals(num_shares: int) -> Tuple[int, ...]:
+    """return num_shares distinct random x values"""
+    x_vals = tuple(set([rand.randint(1, 999999) for _ in range(num_shares)]))
+    for _ in range(num_shares - len(x_vals)):
+        x_vals += (max(x_vals) + 1,)
+    return x_vals
+
+
+def merge_shares(shares: Sequence[Union[Share, Dict]]) -> Union[int, bytes]:
+    """reconstruct secret as int, or as bytes if split chunk by chunk, from sequence of shares"""
+    x_vals = [share['x'] for share in shares]
+    if isinstance(shares[0]['y'], (tuple, list)):
+        return chunks_to_bytes(interpolate_vectors(x_vals, [share['y'] for share in shares], chunk_prime))
+    modulus = primes[bisect_left(primes, max(shares, key=itemgetter('y'))['y'])]
+    return interpolate(x_vals, [share['y'] for share in shares], modulus)
+
+
+def merge_bytes(shares: Sequence[Union[Share, Dict]]) -> bytes:
+    """reconstruct secret bytes from sequence of shares"""
+    secret = merge_shares(shares)
+    return secret if isinstance(secret, bytes) else int_to_bytes(secret)
+
+
 def merge(shares: Sequence[Union[Share, Dict]]) -> str:
     """reconstruct secret from sequence of shares"""
-    modulus = primes[bisect_left(primes, max(shares, key=itemgetter('y'))['y'])]
-    threshold = len(shares)
-    y_intercept = 0
-    for i in range(threshold):
-        numerator, denominator = 1, 1
-        for j in range(threshold):
-            if i != j:
-                numerator = (numerator * (0 - shares[j]['x'])) % modulus
-                denominator = (denominator * (shares[i]['x'] - shares[j]['x'])) % modulus
-        lagrange_polynomial = numerator * modulo_inverse(denominator, modulus)
-        y_intercept = (modulus + y_intercept + (shares[i]['y'] * lagrange_polynomial)) % modulus
-    return int_to_str(y_intercept)
+    secret = merge_shares(shares)
+    return secret_to_str(secret)
 
 
-def split(secret: str, threshold: int, num_shares: int) -> Sequence[Share]:
-    """split secret into shares such that threshold number or more are required to reconstruct"""
-    y_intercept = str_to_int(secret)
+def decode_shares(shares: Sequence[Union[Share, Dict]], threshold: int) -> Tuple[Union[int, bytes], Tuple[Dict, ...]]:
+    """reconstruct secret as int, or as bytes if split chunk by chunk, from sequence of shares correcting up to
+    (len(shares) - threshold) // 2 faulty shares, and return it with the faulty shares"""
+    widths = [len(share['y']) if isinstance(share['y'], (tuple, list)) else 0 for share in shares]
+    width = Counter(widths).most_common(1)[0][0]
+    faulty = tuple(share for share, share_width in zip(shares, widths) if share_width != width)
+    shares = [share for share, share_width in zip(shares, widths) if share_width == width]
+    if len(shares) < threshold:
+        raise IndexError(threshold)
+    x_vals = [share['x'] for share in shares]
+    if not width:
+        # y values of valid shares are uniformly distributed in the field, so the median lands on its prime
+        modulus = primes[bisect_left(primes, sorted(share['y'] for share in shares)[len(shares) // 2])]
+        secret, indices = decode(x_vals, [share['y'] for share in shares], threshold, modulus)
+    else:
+        chunks, indices = [], set()
+        for y_vals in zip(*(share['y'] for share in shares)):
+            chunk, chunk_indices = decode(x_vals, y_vals, threshold, chunk_prime)
+            chunks.append(chunk)
+            indices.update(chunk_indices)
+        if len(indices) > (len(shares) - threshold) // 2:
+            raise ValueError('too many faulty shares to decode')
+        secret = chunks_to_bytes(chunks)
+    return secret, faulty + tuple(shares[i] for i in sorted(indices))
+
+
+def merge_robust(shares: Sequence[Union[Share, Dict]], threshold: int) -> Tuple[str, Tuple[Dict, ...]]:
+    """reconstruct secret from sequence of shares, some of which may be faulty, and return it with the faulty shares"""
+    secret, faulty = decode_shares(shares, threshold)
+    return secret_to_str(secret), faulty
+
+
+def merge_bytes_robust(shares: Sequence[Union[Share, Dict]], threshold: int) -> Tuple[bytes, Tuple[Dict, ...]]:
+    """reconstruct secret bytes from sequence of shares, some of which may be faulty, and return it with faulty ones"""
+    secret, faulty = decode_shares(shares, threshold)
+    return (secret if isinstance(secret, bytes) else int_to_bytes(secret)), faulty
+
+
+def split_int(y_intercept: int, threshold: int, num_shares: int) -> Sequence[Share]:
+    """split int into shares over the smallest (mersenne) prime field that holds it"""
+    x_vals = get_x_vals(num_shares)
     modulus = primes[bisect_left(primes, y_intercept)]  # throws IndexError if secret is too large
     coefficients = (y_intercept,) + tuple(map(lambda _: rand.randint(1, modulus - 1), range(threshold - 1)))
-    x_vals = tuple(set([rand.randint(1, 999999) for _ in range(num_shares)]))
-    for _ in range(num_shares - len(x_vals)):
-        x_vals += (max(x_vals) + 1,)
-    return tuple(Share(x, polynomial(x, coefficients, modulus)) for x in x_vals)
+    return tuple(Share(x, y) for x, y in zip(x_vals, evaluate(coefficients, x_vals, modulus)))
+
+
+def split_chunks(secret: bytes, threshold: int, num_shares: int) -> Sequence[Share]:
+    """split bytes into shares chunk by chunk over the field chunk_prime"""
+    x_vals = get_x_vals(num_shares)
+    chunks = bytes_to_chunks(secret)
+    coefficients = (chunks,) + tuple(tuple(rand.randint(1, chunk_prime - 1) for _ in chunks)
+                                     for _ in range(threshold - 1))
+    return tuple(Share(x, y) for x, y in zip(x_vals, evaluate_vectors(coefficients, x_vals, chunk_prime)))
+
+
+def split_bytes(secret: bytes, threshold: int, num_shares: int) -> Sequence[Share]:
+    """split secret bytes into shares such that threshold number or more are required to reconstruct"""
+    if len(secret) > chunked_threshold:
+        return split_chunks(secret, threshold, num_shares)
+    return split_int(bytes_to_int(secret), threshold, num_shares)
+
+
+def split(secret: str, threshold: int, num_shares: int) -> Sequence[Share]:
+    """split secret into shares such that threshold number or more are required to reconstruct"""
+    return split_bytes(secret.encode('utf-8'), threshold, num_shares)
 
 
 def load_from_file(file: Union[str, IO]) -> any:
     """load an object from file on disk or file-like object"""
     if isinstance(file, TextIOWrapper):
-        return loads(file.read())
+        with metrics.stage('json_load'):
+            return loads(file.read())
     elif isinstance(file, str):
-        with open(file, 'r') as infile:
+        with open(file, 'r') as infile, metrics.stage('json_load'):
             return load(infile)
@@ -6,6 +6,8 @@
 from json import dump, load
 from os import listdir, path, uname
 
+from .metrics import metrics
+
 local_cache_dir = u'/usr/local/bin/Vault/cache'
 
 
@@ -49,7 +51,7 @@ def receive_files(filename_prefix: str, expected_files: int = 0) -> list:
 
 def send(sender: str, receiver: str, payload: dict, ) -> None:
     transport_file = path.join(local_cache_dir, '{}_{}.json'.format(receiver, sender))
-    with open(transport_file, 'w') as outfile:
+    with open(transport_file, 'w') as outfile, metrics.stage('json_dump'):
         dump(payload, outfile, indent=4)
 
 
@@ -4,11 +4,16 @@
 #  vault/vault.py:
 #
 
+from functools import partial
 from multiprocessing.pool import ThreadPool
-from typing import Callable, List, Sequence, Union, TypeVar
+from typing import Callable, Dict, Iterable, List, Sequence, Sized, Tuple, Union, TypeVar
+from uuid import uuid4
 
 from .disks import open_device
-from .primitives import RSA, Share, decrypt, decrypt_and_encrypt, encrypt, get_random_str, merge, split, load_from_file
+from .executors import Executor, ProcessExecutor, ThreadExecutor, decrypt_share, decrypt_share_with, get_key_executor
+from .primitives import EncryptionSession, Key, decrypt, decrypt_and_encrypt, decrypt_bytes, encrypt, \
+    encrypt_bytes, export_public_key, get_key_pool, get_random_str, key_registry, merge, split, \
+    load_from_file, pack_share
 from .transport import send, list_files, receive_files
 
 T = TypeVar('T')
@@ -35,23 +40,51 @@ def run_parallel(func: Callable[..., T], func_args_iterable: Sequence[Union[Sequ
     return []
 
 
+worker_sessions = []
+
+
+def init_split_worker(pub_keys: Sequence[str]) -> None:
+    """
+    open one encryption session per custodian public key once per worker process
+    a session data key protects the shares of every secret the worker splits for that custodian
+    """
+    global worker_sessions
+    worker_sessions = [EncryptionSession(pub_key) for pub_key in pub_keys]
+
+
+def split_and_encrypt(secret_id: str, value: str, n: int) -> Tuple[str, List[dict]]:
+    """split secret and encrypt each share for the custodian with the corresponding worker encryption session"""
+    m = len(worker_sessions)
+    shares = split(secret=value, threshold=n, num_shares=m)
+    return secret_id, [{'x': share['x'], 'n': n, 'm': m,
+                        'y': session.encrypt_bytes(pack_share(share['x'], share['y'], n, m))}
+                       for share, session in zip(shares, worker_sessions)]
+
+
 class CannotDecryptException(Exception):
     pass
 
 
 class Agent(dict):
-    def __init__(self, agent_id: str, address: str, rsa_key: Union[str, RSA.RsaKey]):
-        self.key = rsa_key if isinstance(rsa_key, RSA.RsaKey) else RSA.importKey(rsa_key)
+    def __init__(self, agent_id: str, address: str, rsa_key: Key):
+        self.key = key_registry.get_key(rsa_key)
         self.can_decrypt = self.key.has_private()
-        self.pub_key = self.key.publickey() if self.can_decrypt else self.key
+        self.pub_key = self.key.public_key() if self.can_decrypt else self.key
         self.agent_id = agent_id
         self.address = address
         self.shares = {}
         super().__init__(agent_id=self.agent_id, address=self.address,
-                         pub_key=self.pub_key.export_key(format='OpenSSH').decode(), shares=self.shares)
+                         pub_key=export_public_key(self.pub_key), shares=self.shares)
 
     def encrypt(self, msg: str) -> str:
-        return encrypt(msg, self.key.publickey())
+        return encrypt(msg, self.pub_key)
+
+    def open_executor(self, kind: str = 'process', workers: int = None) -> Executor:
+        """executor whose workers hold the private key of this agent under its agent id"""
+        if self.can_decrypt:
+            return get_key_executor({self.agent_id: self.key}, kind, workers)
+        else:
+            raise CannotDecryptException('{} instance does not have private key to decrypt'.format(self.__class__))
 
     def decrypt(self, enc_msg: str) -> str:
         if self.can_decrypt:
@@ -59,8 +92,14 @@ class Agent(dict):
         else:
             raise CannotDecryptException('{} instance does not have private key to decrypt'.format(self.__class__))
 
-    def add_share(self, secret_id: str, x: int, y: int, n: int, m: int) -> None:
-        self.shares[secret_id] = {'x': x, 'y': self.encrypt(str(y)), 'n': n, 'm': m}
+    def open_session(self) -> EncryptionSession:
+        return EncryptionSession(self.pub_key)
+
+    def add_share(self, secret_id: str, x: int, y: Union[int, Sequence[int]], n: int, m: int,
+                  session: EncryptionSession = None) -> None:
+        packed_share = pack_share(x, y, n, m)
+        enc_y = session.encrypt_bytes(packed_share) if session else encrypt_bytes(packed_share, self.pub_key)
+        self.shares[secret_id] = {'x': x, 'y': enc_y, 'n': n, 'm': m}
 
     def send_share_via_transport(self, secret_id: str) -> None:
         payload = {secret_id: self.shares[secret_id]}
@@ -70,7 +109,7 @@ class Agent(dict):
         for secret_id, share in data.items():
             self.shares[secret_id] = share
 
-    def send_share_to_vault(self, vault_id: str, recipient_key: RSA.RsaKey, secret_id: str) -> None:
+    def send_share_to_vault(self, vault_id: str, recipient_key: Key, secret_id: str) -> None:
         def prepare(secret_id: str) -> dict:
             share = self.shares.get(secret_id)
             if share is not None:
@@ -84,18 +123,20 @@ class Agent(dict):
 
 
 class Vault(dict):
-    def __init__(self, vault_id: str, custodians: dict, rsa_key: Union[str, RSA.RsaKey, None] = None):
+    def __init__(self, vault_id: str, custodians: dict, rsa_key: Union[Key, None] = None, key_type: str = 'rsa'):
         self.vault_id = vault_id
         self.custodians = run_parallel(lambda agent_id, params: Agent(agent_id, params['address'], params['rsa_key']),
                                        list(custodians.items()))
         self.secrets = {}
         self.secret_ids = []
         if rsa_key is None:
-            key = RSA.generate(2048)
+            key = get_key_pool(key_type).get()
         else:
-            key = rsa_key if isinstance(rsa_key, RSA.RsaKey) else RSA.importKey(rsa_key)
-        self.pub_key = key.publickey().export_key(format='OpenSSH').decode()
+            key = key_registry.get_key(rsa_key)
+        self.pub_key = export_public_key(key)
         self.decrypt = lambda enc_msg: decrypt(enc_msg, key)
+        self.decrypt_bytes = lambda enc_msg: decrypt_bytes(enc_msg, key)
+        self.open_executor = lambda kind='process', workers=None: get_key_executor({vault_id: key}, kind, workers)
         super().__init__(vault_id=self.vault_id, secret_ids=self.secret_ids, custodians=self.custodians)
 
     def load_secret(self, secret_id: str, params: dict) -> None:
@@ -111,17 +152,76 @@ class Vault(dict):
     def set_secret_from_random(self, secret_id: str, length: int = 32) -> None:
         self.set_secret_from_value(secret_id, get_random_str(length))
 
-    def set_secret_from_shares(self, secret_id: str, shares: Sequence[dict]) -> None:
-        shares = [Share(x=share['x'], y=int(self.decrypt(share['y']))) for share in shares]
-        self.set_secret_from_value(secret_id, merge(shares))
-
-    def split_to_custodians(self, secret_id: str, n: int, custodians: Sequence[Agent] = ()) -> None:
+    def set_secret_from_shares(self, secret_id: str, shares: Iterable[dict], executor: Executor = None,
+                               threshold: int = None) -> None:
+        """
+        decrypt shares concurrently as they arrive, in executor (from open_executor) if provided, skipping shares that
+        do not decrypt, and merge as soon as threshold (by default that of the shares) valid shares are decrypted
+        """
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadExecutor(len(shares) if isinstance(shares, Sized) else None)
+            decrypted = executor.imap_unordered(partial(decrypt_share, decrypt_func=self.decrypt_bytes), shares)
+        else:
+            decrypted = executor.imap_unordered(partial(decrypt_share_with, self.vault_id), shares)
+        valid_shares = []
+        try:
+            for share in decrypted:
+                if share is not None:
+                    valid_shares.append(share)
+                    if len(valid_shares) >= (threshold or share['n']):
+                        break
+            else:
+                raise ValueError('only {} valid shares for secret {}'.format(len(valid_shares), secret_id))
+        finally:
+            if own_executor:
+                executor.terminate(wait=False)
+        self.set_secret_from_value(secret_id, merge(valid_shares))
+
+    def open_sessions(self, custodians: Sequence[Agent] = ()) -> Dict[str, EncryptionSession]:
+        """one encryption session per custodian, to share across all secrets of a provisioning batch"""
+        return {custodian.agent_id: custodian.open_session() for custodian in custodians or self.custodians}
+
+    def split_to_custodians(self, secret_id: str, n: int, custodians: Sequence[Agent] = (),
+                            sessions: Dict[str, EncryptionSession] = None) -> None:
         custodians = custodians or self.custodians
+        sessions = sessions or {}
         value = self.secrets[secret_id]
         m = len(custodians)
         if not (not value or n <= 1 or m < n):
             shares = split(secret=value, threshold=n, num_shares=m)
-            run_parallel(lambda c, s: c.add_share(secret_id, s['x'], s['y'], n, m), list(zip(custodians, shares)))
+            run_parallel(lambda c, s: c.add_share(secret_id, s['x'], s['y'], n, m, sessions.get(c.agent_id)),
+                         list(zip(custodians, shares)))
+
+    def split_many_to_custodians(self, secret_ids: Sequence[str], n: int, custodians: Sequence[Agent] = (),
+                                 processes: int = None) -> Dict[str, Dict[str, dict]]:
+        """split and encrypt secrets in a process pool, return bundles of shares by secret id for each custodian"""
+        custodians = custodians or self.custodians
+        m = len(custodians)
+        bundles = {custodian.agent_id: {} for custodian in custodians}
+        secret_ids = [secret_id for secret_id in secret_ids if self.secrets[secret_id]]
+        if secret_ids and 1 < n <= m:
+            with ProcessExecutor(processes, init_split_worker, ([custodian['pub_key'] for custodian in custodians],)) \
+                    as executor:
+                results = executor.starmap(split_and_encrypt, [(secret_id, self.secrets[secret_id], n)
+                                                               for secret_id in secret_ids])
+            for secret_id, shares in results:
+                for custodian, share in zip(custodians, shares):
+                    custodian.shares[secret_id] = share
+                    bundles[custodian.agent_id][secret_id] = share
+        return bundles
+
+    def load_secrets(self, secrets: Dict[str, dict]) -> None:
+        """provision many secrets at once, sending one bundle of shares to each custodian per threshold"""
+        secret_ids_by_threshold = {}
+        for secret_id, params in secrets.items():
+            self.set_secret_from_random(secret_id, params.get('length', 32))
+            secret_ids_by_threshold.setdefault(max(params.get('threshold_shares', 3), 2), []).append(secret_id)
+        for n, secret_ids in secret_ids_by_threshold.items():
+            bundle_id = 'secrets:{}'.format(uuid4())
+            bundles = self.split_many_to_custodians(secret_ids, n)
+            run_parallel(lambda agent_id, bundle: send(sender=bundle_id, receiver=agent_id, payload=bundle),
+                         list(bundles.items()))
 
     def set_secret_from_inventory(self, secret_id: str, **kwargs) -> None:
         share_files = [fn for fn in list_files('custodian') if fn.split('_')[1].split('.')[0] == secret_id]
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3.7
+# -*- coding: utf-8 -*-
+"""
+    benchmark rsa private key throughput (decrypt and rewrap of shares) of the vault executors and dump results as json
+    usage: benchmark_executors.py [--workers 1 2 4 8] [--messages 200] [--kinds inline thread process] [--output f.json]
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from os.path import abspath, dirname, join
+from typing import Dict, List, Sequence
+
+repo_dir = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, join(repo_dir, 'Vault'))
+
+from Crypto.PublicKey import RSA  # noqa: E402
+from vault.executors import decrypt_bytes_with, get_key_executor, rewrap_with  # noqa: E402
+from vault.primitives import encrypt_bytes  # noqa: E402
+
+
+def run(kind: str, workers: int, key: RSA.RsaKey, recipient_key: str, num_messages: int) -> Dict:
+    # every message has its own data key, decrypt and rewrap use separate messages so no unwrapped key is reused
+    public_key = key.publickey()
+    messages = [encrypt_bytes(b'%d' % i, public_key) for i in range(num_messages)]
+    with get_key_executor({'benchmark': key}, kind, workers) as executor:
+        executor.starmap(decrypt_bytes_with, [('benchmark', messages[0])] * executor.workers)  # warm up workers
+        start = time.perf_counter()
+        executor.starmap(decrypt_bytes_with, [('benchmark', msg) for msg in messages])
+        decrypt_seconds = time.perf_counter() - start
+        messages = [encrypt_bytes(b'%d' % i, public_key) for i in range(num_messages)]
+        start = time.perf_counter()
+        executor.starmap(rewrap_with, [('benchmark', msg, recipient_key) for msg in messages])
+        rewrap_seconds = time.perf_counter() - start
+    return {'executor': kind, 'workers': workers, 'messages': num_messages,
+            'decrypt_per_second': num_messages / decrypt_seconds, 'rewrap_per_second': num_messages / rewrap_seconds}
+
+
+def benchmark(kinds: Sequence[str], workers_list: Sequence[int], num_messages: int, key_bits: int) -> List[Dict]:
+    key = RSA.generate(key_bits)
+    recipient_key = RSA.generate(key_bits).publickey().export_key().decode()
+    results = []
+    for kind in kinds:
+        for workers in ([1] if kind == 'inline' else workers_list):
+            result = run(kind, workers, key, recipient_key, num_messages)
+            results.append(result)
+            print(json.dumps(result), file=sys.stderr)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark vault executors')
+    parser.add_argument('--kinds', nargs='+', default=['inline', 'thread', 'process'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--key-bits', type=int, default=2048)
+    parser.add_argument('--output', type=str, default='', help='write json to file instead of stdout')
+    args = parser.parse_args()
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': benchmark(kinds=args.kinds, workers_list=args.workers, num_messages=args.messages,
+                             key_bits=args.key_bits),
+    }
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
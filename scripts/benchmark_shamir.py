@@ -0,0 +1,126 @@
+#!/usr/bin/env python3.7
+# -*- coding: utf-8 -*-
+"""
+    benchmark shamir secret sharing split/merge of the crypt, vault and share packages and dump results as json,
+    merge_seconds with the lagrange basis cache cleared before each merge and merge_warm_seconds with it warm
+    usage: benchmark_shamir.py [--max-exponent E] [--thresholds 2 3 5] [--num-shares 5 10] [--output file.json]
+"""
+import argparse
+import json
+import platform
+import random
+import string
+import sys
+import time
+from os.path import abspath, dirname, join
+from typing import Callable, Dict, List, Sequence
+
+repo_dir = dirname(dirname(abspath(__file__)))
+for package_dir in (repo_dir, join(repo_dir, 'Vault'), join(repo_dir, 'src')):
+    sys.path.insert(0, package_dir)
+
+from crypt import primitives as crypt_primitives  # noqa: E402 src/crypt must shadow the standard library crypt module
+from crypt import arithmetic as crypt_arithmetic  # noqa: E402
+from share import arithmetic as share_arithmetic  # noqa: E402
+from share.agent import Secret  # noqa: E402
+from vault import arithmetic as vault_arithmetic, primitives as vault_primitives  # noqa: E402
+
+mersenne_exponents = (1279, 2203, 2281, 3217, 4253, 4423, 9689, 9941, 11213, 19937, 21701, 23209, 44497, 86243, 110503,
+                      132049, 216091, 756839, 859433, 1257787, 1398269, 2976221, 3021377, 6972593, 13466917, 20996011,
+                      24036583, 25964951, 30402457)
+
+
+def share_split(secret: str, threshold: int, num_shares: int) -> Sequence:
+    return Secret.secret_to_shares(agent={}, secret=secret, uuid='benchmark', n=threshold, m=num_shares)
+
+
+implementations = {
+    'crypt': (crypt_primitives.split, crypt_primitives.merge, crypt_primitives, crypt_arithmetic),
+    'vault': (vault_primitives.split, vault_primitives.merge, vault_primitives, vault_arithmetic),
+    'share': (share_split, Secret.shares_to_secret, None, share_arithmetic),
+}
+
+
+def secret_for_exponent(exponent: int) -> str:
+    """random ascii secret whose integer encoding lands on the mersenne prime 2**exponent - 1"""
+    previous = max([e for e in mersenne_exponents if e < exponent] or [0])
+    length = max((previous + 9) // 8, 1)
+    if length * 8 - 1 > exponent:
+        raise ValueError('no ascii secret lands on 2**{} - 1'.format(exponent))
+    return ''.join(random.choice(string.ascii_letters) for _ in range(length))
+
+
+def best_of(func: Callable[[], any], repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(name: str, secret: str, threshold: int, num_shares: int, repeats: int, chunked: bool) -> Dict:
+    split, merge, module, arithmetic = implementations[name]
+    if module is not None:
+        default_threshold = module.chunked_threshold
+        module.chunked_threshold = default_threshold if chunked else float('inf')
+    try:
+        shares = split(secret, threshold, num_shares)
+        if merge(shares[:threshold]) != secret:
+            raise AssertionError('{} failed to reconstruct secret'.format(name))
+        split_seconds = best_of(lambda: split(secret, threshold, num_shares), repeats)
+        merge_warm_seconds = best_of(lambda: merge(shares[:threshold]), repeats)
+        merge_seconds = best_of(lambda: arithmetic.lagrange_basis.cache_clear() or merge(shares[:threshold]), repeats)
+    finally:
+        if module is not None:
+            module.chunked_threshold = default_threshold
+    return {'implementation': name, 'secret_length': len(secret), 'threshold': threshold, 'num_shares': num_shares,
+            'mode': 'chunked' if chunked and module is not None and len(secret) > default_threshold else 'bignum',
+            'split_seconds': split_seconds, 'merge_seconds': merge_seconds, 'merge_warm_seconds': merge_warm_seconds}
+
+
+def benchmark(exponents: Sequence[int], thresholds: Sequence[int], num_shares_list: Sequence[int],
+              repeats: int, chunked: bool) -> List[Dict]:
+    results = []
+    for exponent in exponents:
+        try:
+            secret = secret_for_exponent(exponent)
+        except ValueError:
+            continue
+        for threshold in thresholds:
+            for num_shares in num_shares_list:
+                if num_shares < threshold:
+                    continue
+                for name in implementations:
+                    try:
+                        result = run(name, secret, threshold, num_shares, repeats, chunked)
+                    except IndexError:
+                        continue  # secret too large for the primes of this implementation
+                    result['prime_exponent'] = exponent
+                    results.append(result)
+                    print(json.dumps(result), file=sys.stderr)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark shamir split/merge')
+    parser.add_argument('--max-exponent', type=int, default=44497, help='largest mersenne exponent to benchmark')
+    parser.add_argument('--thresholds', type=int, nargs='+', default=[2, 3, 5, 10])
+    parser.add_argument('--num-shares', type=int, nargs='+', default=[5, 10, 50])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--chunked', action='store_true', help='let crypt and vault use chunked mode for long secrets')
+    parser.add_argument('--output', type=str, default='', help='write json to file instead of stdout')
+    args = parser.parse_args()
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': benchmark(exponents=[e for e in mersenne_exponents if e <= args.max_exponent],
+                             thresholds=args.thresholds, num_shares_list=args.num_shares,
+                             repeats=args.repeats, chunked=args.chunked),
+    }
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
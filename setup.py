@@ -16,7 +16,7 @@ setup(
         package_dir={'crypt': 'src/crypt'},
         package_data={'crypt': 'inventory/*.json'},
         install_requires=[
-                'pycryptodome>=3.6.1',
+                'pycryptodome>=3.21.0',
                 'ifaddr>=0.1.4',
                 'matplotlib>=3.1.1',
                 'mplcursors>=0.2.1',
@@ -27,20 +27,18 @@
 #    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE                                     #
 #    SOFTWARE.                                                                                                         #
 ########################################################################################################################
-from base64 import b64decode, b64encode
 from binascii import hexlify, unhexlify
 from bisect import bisect_left
-from io import BytesIO, TextIOWrapper
+from io import TextIOWrapper
 from os.path import isfile
 from random import SystemRandom
-from typing import Callable, IO, Sequence, Union
+from typing import Callable, Dict, IO, Sequence, Union
 from uuid import uuid4
 
-from Crypto.Cipher import AES, PKCS1_OAEP  # need pycryptodome, run: sudo -H pip3 install pycryptodome
-from Crypto.PublicKey import RSA
-from Crypto.Random import get_random_bytes
-
+from .arithmetic import evaluate, interpolate
 from .collections import Custodian, Custodians, Share, Shares, run_parallel
+from .crypto import EncryptionSession, decrypt_bytes, encrypt_bytes, export_public_key, get_key_pool, key_registry
+from .transport import pack_share, unpack_y
 
 rand = SystemRandom()
 primes = [(2 ** e) - 1 for e in (1279, 2203, 2281, 3217, 4253, 4423, 9689, 9941, 11213, 19937, 21701, 23209, 44497,
@@ -55,49 +53,29 @@ def int_to_str(int_arg: int) -> str:
     return unhexlify(format(int_arg, 'x')).decode('utf-8')
 
 
-def modulo_inverse(number: int, modulus: int) -> int:
-    def egcd(a: int, b: int) -> (int, int, int):
-        if a == 0:
-            return b, 0, 1
-        else:
-            g, y, x = egcd(b % a, a)
-            return g, x - (b // a) * y, y
-
-    return (modulus + egcd(modulus, abs(number % modulus))[2]) % modulus
-
-
 class Agent(object):
-    def __init__(self, name: str, private_key: Union[str, IO, None] = None, uuid: str = None):
+    def __init__(self, name: str, private_key: Union[str, IO, None] = None, uuid: str = None, key_type: str = 'rsa'):
         self.name = name
         if isinstance(private_key, str) and isfile(private_key):
-            with open(private_key, 'r') as infile:
-                private_key = RSA.importKey(infile.read())
+            private_key = key_registry.entry_from_file(private_key)[0]
         elif isinstance(private_key, TextIOWrapper):
-            private_key = RSA.importKey(private_key.read())
+            private_key = key_registry.get_key(private_key.read())
         elif private_key is None:
-            private_key = RSA.generate(2048)
+            private_key = get_key_pool(key_type).get()
         else:
             raise ValueError('private key must be a filename or file object or None')
-        self.public_key = private_key.publickey().export_key(format='OpenSSH').decode()
-        self.cipher_rsa = PKCS1_OAEP.new(private_key)
-        self.key_size = private_key.size_in_bytes()
+        self.public_key = export_public_key(private_key)
+        self.decrypt_bytes = lambda msg: decrypt_bytes(msg, private_key)
         self.uuid = uuid or str(uuid4())
 
     def decrypt_share(self, share: Share) -> Share:
-        enc_y = BytesIO(b64decode(share.y.encode()))
-        enc_encryption_key, nonce, tag, cipher_text = [enc_y.read(size) for size in (self.key_size, 16, 16, -1)]
-        encryption_key = self.cipher_rsa.decrypt(enc_encryption_key)
-        cipher_aes = AES.new(encryption_key, AES.MODE_EAX, nonce)
-        share['y'] = int(cipher_aes.decrypt_and_verify(cipher_text, tag).decode())
+        share['y'] = unpack_y(self.decrypt_bytes(share.y))
         return share
 
     @staticmethod
-    def encrypt_share(share: Share, custodian: Custodian) -> Share:
-        encryption_key = get_random_bytes(32)
-        enc_encryption_key = PKCS1_OAEP.new(RSA.importKey(custodian.pubkey)).encrypt(encryption_key)
-        cipher_aes = AES.new(encryption_key, AES.MODE_EAX)
-        cipher_text, tag = cipher_aes.encrypt_and_digest(str(share.y).encode())
-        share['y'] = b64encode(enc_encryption_key + cipher_aes.nonce + tag + cipher_text).decode()
+    def encrypt_share(share: Share, custodian: Custodian, session: EncryptionSession = None) -> Share:
+        packed_share = pack_share(share.x, share.y, share.num_required, share.num_generated)
+        share['y'] = session.encrypt_bytes(packed_share) if session else encrypt_bytes(packed_share, custodian.pubkey)
         return share
 
     def __repr__(self):
@@ -111,14 +89,17 @@ class Secret(object):
     def __init__(self, agent: Agent,
                  secret: Union[Callable[[], str], str] = None, uuid: str = None,
                  n: int = 3, custodians: Custodians = (),
-                 shares: Shares = ()):
+                 shares: Shares = (), sessions: Dict[str, EncryptionSession] = None):
         if (isinstance(secret, str) or callable(secret)) and isinstance(custodians, Custodians):
             m = len(custodians)
             n = min(n, m)
             secret = secret if isinstance(secret, str) else secret()
             uuid = uuid or str(uuid4())
             shares = self.secret_to_shares(agent=eval(repr(agent)), secret=secret, uuid=uuid, n=n, m=m)
-            custodians.assign_shares(shares=shares, transform=lambda s, c: agent.encrypt_share(s, c))
+            # each custodian gets one share, so sessions only pay off for batches of secrets opened by the caller
+            sessions = sessions or {}
+            custodians.assign_shares(shares=shares,
+                                     transform=lambda s, c: agent.encrypt_share(s, c, sessions.get(c.pubkey)))
         elif isinstance(shares, Shares):
             shares = Shares(run_parallel(agent.decrypt_share, shares))
             secret = self.shares_to_secret(shares=shares)
@@ -133,31 +114,17 @@ class Secret(object):
     def secret_to_shares(agent: dict, secret: str, uuid: str, n: int, m: int) -> Shares:
         y_intercept = str_to_int(secret)
         modulus = primes[bisect_left(primes, y_intercept)]
-        coefficients = (y_intercept,) + tuple(map(lambda _: rand.randint(1, modulus - 1), range(n)))
-
-        def polynomial(x: int) -> Share:
-            y = 0
-            for i in range(0, len(coefficients) - 1):
-                y = (y + (coefficients[i] * (x ** i) % modulus) % modulus) % modulus
-            return Share(agent=agent, uuid=uuid, num_required=n, num_generated=m, x=x, y=y)
+        coefficients = (y_intercept,) + tuple(map(lambda _: rand.randint(1, modulus - 1), range(n - 1)))
 
         x_vals = tuple(set([rand.randint(1, 999999) for _ in range(m)]))
         for _ in range(m - len(x_vals)):
             x_vals += (max(x_vals) + 1,)
 
-        return Shares([polynomial(x) for x in x_vals])
+        return Shares([Share(agent=agent, uuid=uuid, num_required=n, num_generated=m, x=x, y=y)
+                       for x, y in zip(x_vals, evaluate(coefficients, x_vals, modulus))])
 
     @staticmethod
     def shares_to_secret(shares: Sequence[Share]) -> str:
         modulus = primes[bisect_left(primes, max(shares, key=lambda share: share['y'])['y'])]
-        y_intercept = 0
-        n = shares[0]['num_required']
-        for i in range(n):
-            numerator, denominator = 1, 1
-            for j in range(n):
-                if i != j:
-                    numerator = (numerator * (0 - shares[j]['x'])) % modulus
-                    denominator = (denominator * (shares[i]['x'] - shares[j]['x'])) % modulus
-            lagrange_polynomial = numerator * modulo_inverse(denominator, modulus)
-            y_intercept = (modulus + y_intercept + (shares[i]['y'] * lagrange_polynomial)) % modulus
-        return int_to_str(y_intercept)
+        shares = shares[:shares[0]['num_required']]
+        return int_to_str(interpolate([share['x'] for share in shares], [share['y'] for share in shares], modulus))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+"""
+
+########################################################################################################################
+#    MIT License                                                                                                       #
+#                                                                                                                      #
+#    Copyright (c) 2018 Vikas Munshi <vikas.munshi@gmail.com>                                                          #
+#                                                                                                                      #
+#    Permission is hereby granted, free of charge, to any person obtaining a copy                                      #
+#    of this software and associated documentation files (the "Software"), to deal                                     #
+#    in the Software without restriction, including without limitation the rights                                      #
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell                                         #
+#    copies of the Software, and to permit persons to whom the Software is                                             #
+#    furnished to do so, subject to the following conditions:                                                          #
+#                                                                                                                      #
+#    The above copyright notice and this permission notice shall be included in all                                    #
+#    copies or substantial portions of the Software.                                                                   #
+#                                                                                                                      #
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR                                        #
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,                                          #
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE                                       #
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER                                            #
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,                                     #
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE                                     #
+#    SOFTWARE.                                                                                                         #
+########################################################################################################################
+from functools import lru_cache
+from typing import Callable, Sequence, Tuple
+
+
+def mersenne_exponent(modulus: int) -> int:
+    """exponent e if modulus is the mersenne number 2**e - 1, else 0"""
+    return modulus.bit_length() if modulus & (modulus + 1) == 0 else 0
+
+
+def reducer(modulus: int) -> Callable[[int], int]:
+    """function reducing a non-negative int in modulo field n, by shift and add if n is a mersenne number"""
+    exponent = mersenne_exponent(modulus)
+    if not exponent:
+        return lambda value: value % modulus
+
+    def reduce(value: int) -> int:
+        while value > modulus:
+            value = (value & modulus) + (value >> exponent)
+        return 0 if value == modulus else value
+
+    return reduce
+
+
+def evaluate(coefficients: Sequence[int], x_vals: Sequence[int], n: int) -> Tuple[int, ...]:
+    """values at each of x_vals of polynomial with given coefficients in modulo field n, using horner's rule"""
+    reduce = reducer(n)
+    y_vals = [0] * len(x_vals)
+    for a in reversed(coefficients):
+        y_vals = [reduce(y * x + a) for x, y in zip(x_vals, y_vals)]
+    return tuple(y_vals)
+
+
+def modulo_inverse(x: int, n: int) -> int:
+    """multiplicative inverse of x in modulo group n, by iterative extended euclidean algorithm"""
+    r, new_r = n, x % n
+    t, new_t = 0, 1
+    while new_r:
+        q = r // new_r
+        r, new_r = new_r, r - q * new_r
+        t, new_t = new_t, t - q * new_t
+    if r != 1:
+        raise ValueError('{} is not invertible modulo n'.format(x))
+    return t % n
+
+
+def batch_inverse(x_vals: Sequence[int], n: int) -> Tuple[int, ...]:
+    """multiplicative inverses of each of x_vals in modulo group n, using a single inversion (montgomery's trick)"""
+    reduce = reducer(n)
+    prefix_products, product = [], 1
+    for x in x_vals:
+        prefix_products.append(product)
+        product = reduce(product * (x % n))
+    inverse = modulo_inverse(product, n)
+    inverses = [0] * len(x_vals)
+    for i in reversed(range(len(x_vals))):
+        inverses[i] = reduce(inverse * prefix_products[i])
+        inverse = reduce(inverse * (x_vals[i] % n))
+    return tuple(inverses)
+
+
+@lru_cache(maxsize=256)
+def lagrange_basis(x_vals: Tuple[int, ...], n: int) -> Tuple[int, ...]:
+    """coefficients c such that f(0) = sum(c[i] * f(x_vals[i])) in modulo field n, cached per (x_vals, n)"""
+    numerators, denominators = [], []
+    for i, x_i in enumerate(x_vals):
+        numerator, denominator = 1, 1
+        for j, x_j in enumerate(x_vals):
+            if i != j:
+                numerator = (numerator * x_j) % n
+                denominator = (denominator * (x_j - x_i)) % n
+        numerators.append(numerator)
+        denominators.append(denominator)
+    return tuple((a * b) % n for a, b in zip(numerators, batch_inverse(denominators, n)))
+
+
+def interpolate(x_vals: Sequence[int], y_vals: Sequence[int], n: int) -> int:
+    """value at 0 of polynomial through points (x_vals, y_vals) in modulo field n"""
+    points = sorted(zip(x_vals, y_vals))
+    basis = lagrange_basis(tuple(x for x, _ in points), n)
+    return sum(c * y for c, (_, y) in zip(basis, points)) % n
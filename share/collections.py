@@ -30,8 +30,9 @@
 from json import dumps, load
 from multiprocessing.pool import ThreadPool
 from os.path import isfile
-from typing import Callable, IO, List, Sequence, Tuple, TypeVar, Union
+from typing import Callable, Dict, IO, List, Sequence, Tuple, TypeVar, Union
 
+from .crypto import EncryptionSession
 from .transport import receive_share, request_share, send_share
 
 T = TypeVar('T')
@@ -134,6 +135,9 @@ class Custodians(HomogeneousMinTwoTuple):
     def assign_shares(self, shares: Shares, transform: Callable[[Share, Custodian], Share] = lambda s: s) -> None:
         run_parallel(func=lambda c, s: c.assign_share(transform(s, c)), func_args_iterable=list(zip(self, shares)))
 
+    def open_sessions(self) -> Dict[str, EncryptionSession]:
+        return {pubkey: EncryptionSession(pubkey) for pubkey in set(c.pubkey for c in self)}
+
     def send_shares(self) -> None:
         run_parallel(func=lambda c: send_share(name=c.name, address=c.address, share=dict(c.share)),
                      func_args_iterable=self)
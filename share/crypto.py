@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+"""
+
+########################################################################################################################
+#    MIT License                                                                                                       #
+#                                                                                                                      #
+#    Copyright (c) 2018 Vikas Munshi <vikas.munshi@gmail.com>                                                          #
+#                                                                                                                      #
+#    Permission is hereby granted, free of charge, to any person obtaining a copy                                      #
+#    of this software and associated documentation files (the "Software"), to deal                                     #
+#    in the Software without restriction, including without limitation the rights                                      #
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell                                         #
+#    copies of the Software, and to permit persons to whom the Software is                                             #
+#    furnished to do so, subject to the following conditions:                                                          #
+#                                                                                                                      #
+#    The above copyright notice and this permission notice shall be included in all                                    #
+#    copies or substantial portions of the Software.                                                                   #
+#                                                                                                                      #
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR                                        #
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,                                          #
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE                                       #
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER                                            #
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,                                     #
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE                                     #
+#    SOFTWARE.                                                                                                         #
+########################################################################################################################
+from base64 import b64decode, b64encode
+from collections import OrderedDict, deque
+from os import stat
+from struct import Struct
+from threading import Condition, Lock, Thread
+from typing import Any, Dict, Tuple, Union
+
+from Crypto.Cipher import AES, PKCS1_OAEP  # need pycryptodome>=3.21, run: sudo -H pip3 install pycryptodome
+from Crypto.Hash import SHA256
+from Crypto.Protocol.DH import key_agreement
+from Crypto.Protocol.KDF import HKDF
+from Crypto.PublicKey import ECC, RSA
+from Crypto.Random import get_random_bytes
+
+# binary envelope: header (magic, version, key type, length of wrapped key), wrapped key, nonce, tag and cipher text
+envelope_header = Struct('>2sBBH')
+envelope_magic = b'CE'
+envelope_version = 1
+key_type_rsa = 0
+key_type_x25519 = 1
+key_types = {'rsa': key_type_rsa, 'x25519': key_type_x25519}
+key_flag_shared = 0x80  # set in the key type of envelopes whose data key is shared by an encryption session
+nonce_size = tag_size = 16
+
+Key = Union[str, bytes, RSA.RsaKey, ECC.EccKey]
+
+
+def generate_key(key_type: str = 'rsa') -> Union[RSA.RsaKey, ECC.EccKey]:
+    if key_types[key_type] == key_type_x25519:
+        return ECC.generate(curve='Curve25519')
+    return RSA.generate(2048)
+
+
+def import_key(key: Union[str, bytes]) -> Union[RSA.RsaKey, ECC.EccKey]:
+    try:
+        return RSA.importKey(key)
+    except ValueError:
+        return ECC.import_key(key)
+
+
+def export_public_key(key: Union[RSA.RsaKey, ECC.EccKey]) -> str:
+    # x25519 keys have no openssh format
+    if isinstance(key, RSA.RsaKey):
+        return key.publickey().export_key(format='OpenSSH').decode()
+    return key.public_key().export_key(format='PEM')
+
+
+class KeyPool(object):
+    # keys pre-generated by a background thread, refilled up to high watermark whenever fewer than low are left
+    def __init__(self, key_type: str = 'rsa', low: int = 2, high: int = 8):
+        self.key_type = key_type
+        self.low = low
+        self.high = max(high, low, 1)
+        self.keys = deque()
+        self.hits = self.misses = 0
+        self.stopped = False
+        self.condition = Condition()
+        self.thread = Thread(target=self.fill, name='key-pool-{}'.format(key_type), daemon=True)
+        self.thread.start()
+
+    def fill(self) -> None:
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.stopped or len(self.keys) < self.low)
+                if self.stopped:
+                    return
+            while not self.stopped and len(self.keys) < self.high:
+                key = generate_key(self.key_type)
+                with self.condition:
+                    self.keys.append(key)
+
+    def get(self) -> Union[RSA.RsaKey, ECC.EccKey]:
+        with self.condition:
+            if self.keys:
+                self.hits += 1
+                key = self.keys.popleft()
+            else:
+                self.misses += 1
+                key = None
+            self.condition.notify()
+        return key if key is not None else generate_key(self.key_type)
+
+    def stats(self) -> Dict[str, int]:
+        with self.condition:
+            return {'hits': self.hits, 'misses': self.misses, 'available': len(self.keys)}
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+
+key_pools = {}
+key_pools_lock = Lock()
+
+
+def get_key_pool(key_type: str = 'rsa', low: int = 2, high: int = 8) -> KeyPool:
+    with key_pools_lock:
+        if key_type not in key_pools:
+            key_pools[key_type] = KeyPool(key_type, low, high)
+        return key_pools[key_type]
+
+
+class X25519Cipher(object):
+    # ecies style data key wrap: ephemeral x25519 key agreement, hkdf sha256 and aes gcm
+    kdf_info = b'x25519 data key wrap'
+
+    def __init__(self, key: ECC.EccKey):
+        self.key = key
+        self.public_bytes = key.public_key().export_key(format='raw')
+
+    def kek(self, shared_secret: bytes, ephemeral_public_bytes: bytes) -> bytes:
+        return HKDF(shared_secret, 32, ephemeral_public_bytes + self.public_bytes, SHA256, context=self.kdf_info)
+
+    def encrypt(self, encryption_key: bytes) -> bytes:
+        ephemeral_key = ECC.generate(curve='Curve25519')
+        ephemeral_public_bytes = ephemeral_key.public_key().export_key(format='raw')
+        kek = key_agreement(static_pub=self.key.public_key(), eph_priv=ephemeral_key,
+                            kdf=lambda shared_secret: self.kek(shared_secret, ephemeral_public_bytes))
+        # every kek is used exactly once, so a constant nonce is safe
+        enc_encryption_key, tag = AES.new(kek, AES.MODE_GCM, nonce=bytes(12)).encrypt_and_digest(encryption_key)
+        return ephemeral_public_bytes + enc_encryption_key + tag
+
+    def decrypt(self, wrapped_key: bytes) -> bytes:
+        ephemeral_public_bytes = bytes(wrapped_key[:32])
+        ephemeral_key = ECC.construct(curve='Curve25519', point_x=int.from_bytes(ephemeral_public_bytes, 'little'))
+        kek = key_agreement(static_priv=self.key, eph_pub=ephemeral_key,
+                            kdf=lambda shared_secret: self.kek(shared_secret, ephemeral_public_bytes))
+        return AES.new(kek, AES.MODE_GCM, nonce=bytes(12)).decrypt_and_verify(wrapped_key[32:-16], wrapped_key[-16:])
+
+
+class KeyRegistry(object):
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.data_keys = OrderedDict()
+        self.lock = Lock()
+
+    @staticmethod
+    def fingerprint(key: Key) -> bytes:
+        if isinstance(key, RSA.RsaKey):
+            material = b'%d:%x:%x' % (key.has_private(), key.e, key.n)
+        elif isinstance(key, ECC.EccKey):
+            material = b'%d:x25519:' % key.has_private() + key.public_key().export_key(format='raw')
+        else:
+            material = key.encode() if isinstance(key, str) else key
+        return SHA256.new(material).digest()
+
+    def lookup(self, cache_key: Any) -> Union[list, None]:
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None:
+                self.entries.move_to_end(cache_key)
+            return entry
+
+    def store(self, cache_key: Any, key: Union[RSA.RsaKey, ECC.EccKey]) -> list:
+        if isinstance(key, RSA.RsaKey):
+            entry = [key, PKCS1_OAEP.new(key), key_type_rsa]
+        else:
+            entry = [key, X25519Cipher(key), key_type_x25519]
+        with self.lock:
+            self.entries[cache_key] = entry
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def entry(self, key: Key) -> list:
+        fingerprint = self.fingerprint(key)
+        entry = self.lookup(fingerprint)
+        if entry is None:
+            entry = self.store(fingerprint, key if isinstance(key, (RSA.RsaKey, ECC.EccKey)) else import_key(key))
+        return entry
+
+    def entry_from_file(self, filename: str) -> list:
+        file_stat = stat(filename)
+        cache_key = (filename, file_stat.st_mtime_ns, file_stat.st_size)
+        entry = self.lookup(cache_key)
+        if entry is None:
+            with open(filename, 'r') as infile:
+                entry = self.store(cache_key, import_key(infile.read()))
+        return entry
+
+    def get_key(self, key: Key) -> Union[RSA.RsaKey, ECC.EccKey]:
+        return self.entry(key)[0]
+
+    def get_cipher(self, key: Key) -> Any:
+        return self.entry(key)[1]
+
+    def unwrap(self, private_key: Key, enc_encryption_key: bytes) -> bytes:
+        parsed_key, cipher = self.entry(private_key)[:2]
+        cache_key = self.fingerprint(parsed_key) + enc_encryption_key
+        with self.lock:
+            encryption_key = self.data_keys.get(cache_key)
+            if encryption_key is not None:
+                self.data_keys.move_to_end(cache_key)
+                return encryption_key
+        encryption_key = cipher.decrypt(enc_encryption_key)
+        with self.lock:
+            self.data_keys[cache_key] = encryption_key
+            while len(self.data_keys) > self.max_size:
+                self.data_keys.popitem(last=False)
+        return encryption_key
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.data_keys.clear()
+
+
+key_registry = KeyRegistry()
+
+
+def pack_envelope(enc_encryption_key: bytes, nonce: bytes, tag: bytes, cipher_text: bytes,
+                  key_type: int = key_type_rsa) -> bytes:
+    header = envelope_header.pack(envelope_magic, envelope_version, key_type, len(enc_encryption_key))
+    return b''.join((header, enc_encryption_key, nonce, tag, cipher_text))
+
+
+def unpack_envelope(envelope: bytes, key_size: int) -> Tuple[int, memoryview, memoryview, memoryview, memoryview]:
+    view = memoryview(envelope)
+    offset, key_type, wrapped_len = 0, key_type_rsa, key_size
+    if len(view) >= envelope_header.size:
+        magic, version, header_key_type, header_wrapped_len = envelope_header.unpack_from(view)
+        if magic == envelope_magic and version == envelope_version and (header_key_type != key_type_rsa or
+                                                                        header_wrapped_len == key_size):
+            offset, key_type, wrapped_len = envelope_header.size, header_key_type, header_wrapped_len
+    nonce_offset = offset + wrapped_len
+    tag_offset = nonce_offset + nonce_size
+    text_offset = tag_offset + tag_size
+    if len(view) < text_offset:
+        raise ValueError('envelope too short')
+    return (key_type, view[offset:nonce_offset], view[nonce_offset:tag_offset], view[tag_offset:text_offset],
+            view[text_offset:])
+
+
+def shares_data_key(envelope: bytes) -> bool:
+    return (len(envelope) >= envelope_header.size and envelope[:2] == envelope_magic and
+            envelope[2] == envelope_version and bool(envelope[3] & key_flag_shared))
+
+
+def unwrap_envelope(envelope: bytes, private_key: Key) -> Tuple[bytes, memoryview, memoryview, memoryview]:
+    parsed_key, _, private_key_type = key_registry.entry(private_key)
+    key_size = parsed_key.size_in_bytes() if private_key_type == key_type_rsa else 0
+    key_type, enc_encryption_key, nonce, tag, cipher_text = unpack_envelope(envelope, key_size)
+    if key_type & ~key_flag_shared != private_key_type:
+        raise ValueError('envelope key type {} does not match private key type {}'.format(key_type, private_key_type))
+    return key_registry.unwrap(parsed_key, enc_encryption_key), nonce, tag, cipher_text
+
+
+def encrypt_envelope(msg: bytes, public_key: Key) -> bytes:
+    _, cipher, key_type = key_registry.entry(public_key)
+    encryption_key = get_random_bytes(32)
+    cipher_aes = AES.new(encryption_key, AES.MODE_EAX)
+    cipher_text, tag = cipher_aes.encrypt_and_digest(msg)
+    return pack_envelope(cipher.encrypt(encryption_key), cipher_aes.nonce, tag, cipher_text, key_type)
+
+
+def encrypt_bytes(msg: bytes, public_key: Key) -> str:
+    return b64encode(encrypt_envelope(msg, public_key)).decode()
+
+
+def decrypt_envelope(envelope: bytes, private_key: Key) -> bytes:
+    encryption_key, nonce, tag, cipher_text = unwrap_envelope(envelope, private_key)
+    cipher_aes = AES.new(encryption_key, AES.MODE_EAX, nonce)
+    return cipher_aes.decrypt_and_verify(cipher_text, tag)
+
+
+def decrypt_bytes(msg: str, private_key: Key) -> bytes:
+    return decrypt_envelope(b64decode(msg), private_key)
+
+
+def rewrap_envelope(envelope: bytes, private_key: Key, public_key: Key) -> bytes:
+    if shares_data_key(envelope):
+        # the session data key protects other messages too, re-encrypt under a fresh data key instead
+        return encrypt_envelope(decrypt_envelope(envelope, private_key), public_key)
+    _, cipher, key_type = key_registry.entry(public_key)
+    encryption_key, nonce, tag, cipher_text = unwrap_envelope(envelope, private_key)
+    return pack_envelope(cipher.encrypt(encryption_key), nonce, tag, cipher_text, key_type)
+
+
+def rewrap(msg: str, private_key: Key, public_key: Key) -> str:
+    return b64encode(rewrap_envelope(b64decode(msg), private_key, public_key)).decode()
+
+
+class EncryptionSession(object):
+    def __init__(self, public_key: Key):
+        _, cipher, self.key_type = key_registry.entry(public_key)
+        self.encryption_key = get_random_bytes(32)
+        self.enc_encryption_key = cipher.encrypt(self.encryption_key)
+
+    def encrypt_envelope(self, msg: bytes) -> bytes:
+        cipher_aes = AES.new(self.encryption_key, AES.MODE_EAX)
+        cipher_text, tag = cipher_aes.encrypt_and_digest(msg)
+        return pack_envelope(self.enc_encryption_key, cipher_aes.nonce, tag, cipher_text,
+                             self.key_type | key_flag_shared)
+
+    def encrypt_bytes(self, msg: bytes) -> str:
+        return b64encode(self.encrypt_envelope(msg)).decode()
@@ -27,14 +27,42 @@
 #    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE                                     #
 #    SOFTWARE.                                                                                                         #
 ########################################################################################################################
-from base64 import b64decode, b64encode
-from io import BytesIO
 from json import dumps, load
 from os.path import expanduser, join
+from struct import Struct
+from typing import Sequence, Tuple, Union
 
-from Crypto.Cipher import AES, PKCS1_OAEP
-from Crypto.PublicKey import RSA
-from Crypto.Random import get_random_bytes
+from .crypto import key_registry, rewrap
+
+# packed shares are a header (magic, x, n, m, field id, number and byte width of y elements) and big-endian y elements
+# the field id tells chunked vectors over chunk_prime from single ints, whose prime merge finds from the y values
+share_struct = Struct('>2sIHHBII')
+share_magic = b'\x00S'
+int_field_id = 0
+chunk_field_id = 255
+
+
+def pack_share(x: int, y: Union[int, Sequence[int]], n: int, m: int) -> bytes:
+    chunked = isinstance(y, (tuple, list))
+    y_vals = tuple(y) if chunked else (y,)
+    width = max((y_i.bit_length() + 7) // 8 for y_i in y_vals)
+    return share_struct.pack(share_magic, x, n, m, chunk_field_id if chunked else int_field_id, len(y_vals), width) + \
+        b''.join(y_i.to_bytes(width, 'big') for y_i in y_vals)
+
+
+def unpack_share(bytes_arg: bytes) -> dict:
+    magic, x, n, m, field_id, count, width = share_struct.unpack_from(bytes_arg)
+    if magic != share_magic or len(bytes_arg) != share_struct.size + count * width:
+        raise ValueError('not a packed share')
+    view = memoryview(bytes_arg)[share_struct.size:]
+    y_vals = tuple(int.from_bytes(view[i * width:(i + 1) * width], 'big') for i in range(count))
+    return {'x': x, 'y': y_vals if field_id == chunk_field_id else y_vals[0], 'n': n, 'm': m}
+
+
+def unpack_y(bytes_arg: bytes) -> Union[int, Tuple[int, ...]]:
+    if bytes_arg[:len(share_magic)] == share_magic:
+        return unpack_share(bytes_arg)['y']
+    return int(bytes_arg.decode())
 
 
 def send_share(name: str, address: str, share: dict) -> None:
@@ -61,25 +89,8 @@ def receive_share(address: str, agent: dict, uuid: str) -> dict:
         share_raw = load(infile)['share']
 
     private_key_file = join(expanduser('~/shares_temp/'), address.split('@')[0])
-    with open(private_key_file, 'r') as infile:
-        private_key = RSA.importKey(infile.read())
-
-    cipher_rsa = PKCS1_OAEP.new(private_key)
-    key_size = private_key.size_in_bytes()
-
-    # decrypt_share
-    enc_y = BytesIO(b64decode(share_raw['y'].encode()))
-    enc_encryption_key, nonce, tag, cipher_text = [enc_y.read(size) for size in (key_size, 16, 16, -1)]
-    encryption_key = cipher_rsa.decrypt(enc_encryption_key)
-    cipher_aes = AES.new(encryption_key, AES.MODE_EAX, nonce)
-    share_raw['y'] = int(cipher_aes.decrypt_and_verify(cipher_text, tag).decode())
-
-    # encrypt_share
-    encryption_key = get_random_bytes(32)
-    enc_encryption_key = PKCS1_OAEP.new(RSA.importKey(agent['public_key'])).encrypt(encryption_key)
-    cipher_aes = AES.new(encryption_key, AES.MODE_EAX)
-    cipher_text, tag = cipher_aes.encrypt_and_digest(str(share_raw['y']).encode())
-    share_raw['y'] = b64encode(enc_encryption_key + cipher_aes.nonce + tag + cipher_text).decode()
+    private_key = key_registry.entry_from_file(private_key_file)[0]
+    share_raw['y'] = rewrap(share_raw['y'], private_key, agent['public_key'])
     share_raw['agent'] = agent
 
     return share_raw
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   crypt/arithmetic.py:
+#
+########################################################################################################################
+#    Author: Vikas Munshi <vikas.munshi@gmail.com>
+#    Version 0.0.1: 2018.05.24
+#
+#    source: https://github.com/vikasmunshi/python-scripts/tree/master/src/
+#    set-up: bash <(curl -s https://github.com/vikasmunshi/python-scripts/tree/master/src/setup.sh)
+#
+########################################################################################################################
+#    MIT License
+#
+#    Copyright (c) 2018 Vikas Munshi
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+########################################################################################################################
+
+
+import functools
+import typing
+
+
+def mersenne_exponent(modulus: int) -> int:
+    """exponent e if modulus is the mersenne number 2**e - 1, else 0"""
+    return modulus.bit_length() if modulus & (modulus + 1) == 0 else 0
+
+
+def reducer(modulus: int) -> typing.Callable[[int], int]:
+    """function reducing a non-negative int in modulo field n, by shift and add if n is a mersenne number"""
+    exponent = mersenne_exponent(modulus)
+    if not exponent:
+        return lambda value: value % modulus
+
+    def reduce(value: int) -> int:
+        while value > modulus:
+            value = (value & modulus) + (value >> exponent)
+        return 0 if value == modulus else value
+
+    return reduce
+
+
+def evaluate(coefficients: typing.Sequence[int], x_vals: typing.Sequence[int], n: int) -> typing.Tuple[int, ...]:
+    """values at each of x_vals of polynomial with given coefficients in modulo field n, using horner's rule"""
+    reduce = reducer(n)
+    y_vals = [0] * len(x_vals)
+    for a in reversed(coefficients):
+        y_vals = [reduce(y * x + a) for x, y in zip(x_vals, y_vals)]
+    return tuple(y_vals)
+
+
+def modulo_inverse(x: int, n: int) -> int:
+    """multiplicative inverse of x in modulo group n, by iterative extended euclidean algorithm"""
+    r, new_r = n, x % n
+    t, new_t = 0, 1
+    while new_r:
+        q = r // new_r
+        r, new_r = new_r, r - q * new_r
+        t, new_t = new_t, t - q * new_t
+    if r != 1:
+        raise ValueError('{} is not invertible modulo n'.format(x))
+    return t % n
+
+
+def batch_inverse(x_vals: typing.Sequence[int], n: int) -> typing.Tuple[int, ...]:
+    """multiplicative inverses of each of x_vals in modulo group n, using a single inversion (montgomery's trick)"""
+    reduce = reducer(n)
+    prefix_products, product = [], 1
+    for x in x_vals:
+        prefix_products.append(product)
+        product = reduce(product * (x % n))
+    inverse = modulo_inverse(product, n)
+    inverses = [0] * len(x_vals)
+    for i in reversed(range(len(x_vals))):
+        inverses[i] = reduce(inverse * prefix_products[i])
+        inverse = reduce(inverse * (x_vals[i] % n))
+    return tuple(inverses)
+
+
+@functools.lru_cache(maxsize=256)
+def lagrange_basis(x_vals: typing.Tuple[int, ...], n: int) -> typing.Tuple[int, ...]:
+    """coefficients c such that f(0) = sum(c[i] * f(x_vals[i])) in modulo field n, cached per (x_vals, n)"""
+    numerators, denominators = [], []
+    for i, x_i in enumerate(x_vals):
+        numerator, denominator = 1, 1
+        for j, x_j in enumerate(x_vals):
+            if i != j:
+                numerator = (numerator * x_j) % n
+                denominator = (denominator * (x_j - x_i)) % n
+        numerators.append(numerator)
+        denominators.append(denominator)
+    return tuple((a * b) % n for a, b in zip(numerators, batch_inverse(denominators, n)))
+
+
+def interpolate(x_vals: typing.Sequence[int], y_vals: typing.Sequence[int], n: int) -> int:
+    """value at 0 of polynomial through points (x_vals, y_vals) in modulo field n"""
+    points = sorted(zip(x_vals, y_vals))
+    basis = lagrange_basis(tuple(x for x, _ in points), n)
+    return sum(c * y for c, (_, y) in zip(basis, points)) % n
+
+
+def evaluate_vectors(coefficients: typing.Sequence[typing.Sequence[int]], x_vals: typing.Sequence[int],
+                     n: int) -> typing.Tuple[typing.Tuple[int, ...], ...]:
+    """element-wise values at each of x_vals of polynomials with coefficients given as vectors, in modulo field n"""
+    reduce = reducer(n)
+    y_vectors = [[0] * len(coefficients[0]) for _ in x_vals]
+    for a_vector in reversed(coefficients):
+        y_vectors = [[reduce(y * x + a) for y, a in zip(y_vector, a_vector)]
+                     for x, y_vector in zip(x_vals, y_vectors)]
+    return tuple(tuple(y_vector) for y_vector in y_vectors)
+
+
+def interpolate_vectors(x_vals: typing.Sequence[int], y_vectors: typing.Sequence[typing.Sequence[int]],
+                        n: int) -> typing.Tuple[int, ...]:
+    """element-wise values at 0 of polynomials through points (x_vals, y_vectors) in modulo field n"""
+    points = sorted(zip(x_vals, y_vectors))
+    basis = lagrange_basis(tuple(x for x, _ in points), n)
+    return tuple(sum(c * y for c, y in zip(basis, y_column)) % n for y_column in zip(*(ys for _, ys in points)))
+
+
+def divide(dividend: typing.Sequence[int], divisor: typing.Sequence[int],
+           n: int) -> typing.Tuple[typing.Tuple[int, ...], typing.Tuple[int, ...]]:
+    """quotient and remainder of polynomials with given coefficients in modulo field n, divisor must be monic"""
+    remainder = [a % n for a in dividend]
+    quotient = [0] * max(len(dividend) - len(divisor) + 1, 0)
+    for i in reversed(range(len(quotient))):
+        quotient[i] = remainder[i + len(divisor) - 1]
+        for j, d in enumerate(divisor):
+            remainder[i + j] = (remainder[i + j] - quotient[i] * d) % n
+    return tuple(quotient), tuple(remainder[:len(divisor) - 1])
+
+
+@functools.lru_cache(maxsize=256)
+def lagrange_polynomials(x_vals: typing.Tuple[int, ...], n: int) -> typing.Tuple[typing.Tuple[int, ...], ...]:
+    """coefficients of the lagrange basis polynomials for x_vals in modulo field n, cached per (x_vals, n)"""
+    product = [1]
+    for x_j in x_vals:
+        product = [((product[i - 1] if i else 0) - x_j * (product[i] if i < len(product) else 0)) % n
+                   for i in range(len(product) + 1)]
+    polynomials = [divide(product, (-x_i % n, 1), n)[0] for x_i in x_vals]
+    denominators = [evaluate(polynomial, (x_i,), n)[0] for polynomial, x_i in zip(polynomials, x_vals)]
+    return tuple(tuple((c * inverse) % n for c in polynomial)
+                 for polynomial, inverse in zip(polynomials, batch_inverse(denominators, n)))
+
+
+def solve_linear(rows: typing.Sequence[typing.Sequence[int]], n: int) -> typing.Union[typing.List[int], None]:
+    """a solution, with free unknowns 0, of the linear system given as augmented rows in modulo field n, or None"""
+    rows = [[a % n for a in row] for row in rows]
+    pivots = []
+    for column in range(len(rows[0]) - 1):
+        r = len(pivots)
+        pivot = next((i for i in range(r, len(rows)) if rows[i][column]), None)
+        if pivot is None:
+            continue
+        rows[r], rows[pivot] = rows[pivot], rows[r]
+        inverse = modulo_inverse(rows[r][column], n)
+        rows[r] = [(a * inverse) % n for a in rows[r]]
+        for i, row in enumerate(rows):
+            if i != r and row[column]:
+                factor = row[column]
+                rows[i] = [(a - factor * b) % n for a, b in zip(row, rows[r])]
+        pivots.append(column)
+        if len(pivots) == len(rows):
+            break
+    if any(row[-1] for row in rows[len(pivots):]):
+        return None
+    solution = [0] * (len(rows[0]) - 1)
+    for row, column in zip(rows, pivots):
+        solution[column] = row[-1]
+    return solution
+
+
+def berlekamp_welch(x_vals: typing.Sequence[int], y_vals: typing.Sequence[int], k: int,
+                    n: int) -> typing.Tuple[int, ...]:
+    """coefficients of the polynomial of degree < k through all but at most (len(x_vals) - k) // 2 of the points"""
+    e = (len(x_vals) - k) // 2
+    rows = []
+    for x, y in zip(x_vals, y_vals):
+        powers = [pow(x, j, n) for j in range(k + e + 1)]
+        rows.append(powers[:k + e] + [-y * power for power in powers[:e]] + [y * powers[e]])
+    solution = solve_linear(rows, n)
+    if solution is None:
+        raise ValueError('too many faulty shares to decode')
+    quotient, remainder = divide(solution[:k + e], solution[k + e:] + [1], n)
+    if any(remainder):
+        raise ValueError('too many faulty shares to decode')
+    return quotient
+
+
+def decode(x_vals: typing.Sequence[int], y_vals: typing.Sequence[int], k: int,
+           n: int) -> typing.Tuple[int, typing.Tuple[int, ...]]:
+    """value at 0 of the polynomial of degree < k through all but at most (len(x_vals) - k) // 2 of the points
+    in modulo field n, and the indices of the points that are not on it"""
+    basis = lagrange_polynomials(tuple(x_vals[:k]), n)
+    coefficients = tuple(sum(y * polynomial[i] for y, polynomial in zip(y_vals[:k], basis)) % n for i in range(k))
+    if evaluate(coefficients, x_vals[k:], n) != tuple(y_vals[k:]):
+        coefficients = berlekamp_welch(x_vals, y_vals, k, n)
+    values = evaluate(coefficients, x_vals, n)
+    faulty = tuple(i for i, (y, value) in enumerate(zip(y_vals, values)) if y != value)
+    if len(faulty) > (len(x_vals) - k) // 2:
+        raise ValueError('too many faulty shares to decode')
+    return coefficients[0], faulty
+
+
+if __name__ == '__main__':
+    import random
+    import timeit
+
+    modulus = (2 ** 19937) - 1
+    for k in (3, 10, 100):
+        x_vals = tuple(random.sample(range(1, 999999), k))
+        denominators = [random.randint(1, modulus - 1) for _ in range(k)]
+        per_share = timeit.timeit(lambda: [modulo_inverse(d, modulus) for d in denominators], number=3) / 3
+        batched = timeit.timeit(lambda: batch_inverse(denominators, modulus), number=3) / 3
+        print('k={:<4} per share inversion {:.4f}s batch inversion {:.4f}s speed-up {:.1f}x'.format(
+            k, per_share, batched, per_share / batched))
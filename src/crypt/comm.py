@@ -34,18 +34,32 @@
 #    SOFTWARE.
 ########################################################################################################################
 
-from http.client import HTTPConnection, HTTPException, HTTPSConnection
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from hashlib import blake2b
+from http.client import HTTPConnection, HTTPException, HTTPResponse, HTTPSConnection, RemoteDisconnected, parse_headers
 from http.server import BaseHTTPRequestHandler, HTTPStatus
+from io import BytesIO
 from json import dumps, loads
-from socket import getfqdn, timeout
+from select import select
+from socket import AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, getfqdn, socket, timeout
 from socketserver import ThreadingTCPServer
-from threading import Thread
+from sys import stderr, version as python_version
+from threading import Condition, Lock, Thread
+from time import monotonic
+from typing import Callable, Iterable, Tuple, Union
 from urllib.parse import parse_qs, unquote, urlencode
 
 try:
     from . import __version__
 except ImportError:
     __version__ = '0.0.1'
+try:
+    from .metrics import metrics
+except ImportError:
+    from metrics import metrics
 
 
 class RemoteObj(object):
@@ -65,23 +79,115 @@ class RemoteObj(object):
     putters = []
 
 
-class Store(dict):
+class StoreHandlers(object):
+    """http handlers of a write-once key value store, mixed into dict (Store) or a persistent store (LogStore)"""
+    write_once = True  # values set over http never change, so complete get responses may be cached as immutable
+
     def http_get(self, args: list, params: dict, headers: dict) -> dict:
         key = '.'.join(args) if args else 'info'
-        return {key: super().get(key)}
+        return {key: self.get(key)}
 
     def http_put(self, args: list, params: dict, headers: dict) -> dict:
         if args:
             key = '.'.join(args)
-            if key not in self:
-                value = params.get('value')
-                self[key] = value
-            return {key: self[key]}
+            return {key: self.setdefault(key, params.get('value'))}
+
+    def http_post(self, args: list, params: dict, headers: dict) -> dict:
+        """
+        batch get and/or put in one request, keys are relative to the dotted prefix args
+        params {'get': [key, ...], 'put': {key: value, ...}} -> {'get': {key: {'status': ..., 'value': ...}, ...},
+        'put': {key: {'status': ..., 'value': ...}, ...}}, puts are applied before gets
+        status of a get is 'found' or 'missing', of a put 'created' or 'exists' (keys are write-once)
+        raises ValueError (bad request) unless put is an object and get a list of strings
+        """
+        puts = params.get('put') or {}
+        gets = params.get('get') or []
+        if not isinstance(puts, dict):
+            raise ValueError('put must be an object of keys and values')
+        if not isinstance(gets, list) or not all(isinstance(key, str) for key in gets):
+            raise ValueError('get must be a list of keys')
+        response = {'get': {}, 'put': {}}
+        results = self.setdefault_many({'.'.join(args + [key]): value for key, value in puts.items()})
+        for key in puts:
+            created, stored = results['.'.join(args + [key])]
+            response['put'][key] = {'status': 'created' if created else 'exists', 'value': stored}
+        for key in gets:
+            full_key = '.'.join(args + [key])
+            if full_key in self:
+                response['get'][key] = {'status': 'found', 'value': self[full_key]}
+            else:
+                response['get'][key] = {'status': 'missing', 'value': None}
+        return response
 
     getters = []
     putters = []
 
 
+class Store(StoreHandlers, dict):
+    def setdefault_many(self, items: dict) -> dict:
+        """setdefault of each item, {key: (created, stored value)}"""
+        return {key: (key not in self, self.setdefault(key, value)) for key, value in items.items()}
+
+
+immutable_cache_control = 'public, max-age=31536000, immutable'
+
+
+def dispatch_request(server: object, command: str, path: str, body: bytes, headers: dict,
+                     log_error: Callable[..., None]) -> Tuple[HTTPStatus, Union[bytes, str, None], dict]:
+    """
+    route request to http_<command> of the object registered on server, status, json response or error and headers
+    get responses carry a strong etag and are answered with 304 if it matches If-None-Match, complete responses of
+    write-once stores are marked immutable
+    """
+    try:
+        req_path, _, req_query = path.partition('?')
+        req_path = [str(x) for x in unquote(req_path).split('/') if x] if req_path else []
+        req_query = {k: v[0] for (k, v) in parse_qs(req_query, True, False).items()} if req_query else {}
+        req_body = body.decode()
+        with metrics.stage('json_loads'):
+            req_body = loads(req_body) if req_body else {}
+        req_params = dict(req_query, **req_body)
+        req_headers = dict(headers)
+    except (AttributeError, IndexError, TypeError, ValueError) as e:
+        log_error('bad request\n%r', e)
+        return HTTPStatus.BAD_REQUEST, None, {}
+    if not req_path:
+        req_path = ['info']
+    try:
+        obj = getattr(server, req_path[0])
+    except AttributeError:
+        log_error('%s not implemented', req_path[0])
+        return HTTPStatus.NOT_IMPLEMENTED, req_path[0], {}
+    try:
+        func = getattr(obj, 'http_' + command.lower())
+    except AttributeError:
+        log_error('%s not implemented', command.lower())
+        return HTTPStatus.NOT_IMPLEMENTED, command.lower(), {}
+    try:
+        response = func(req_path[1:], req_params, req_headers)
+    except AttributeError:
+        method = '/'.join(req_path[1:]) or req_path[0]
+        log_error('%s not implemented', method)
+        return HTTPStatus.NOT_IMPLEMENTED, method, {}
+    except ValueError as e:
+        log_error('bad request\n%r', e)
+        return HTTPStatus.BAD_REQUEST, str(e), {}
+    try:
+        with metrics.stage('json_dumps'):
+            response_body = dumps(response or {}).encode()
+    except (IndexError, TypeError) as e:
+        log_error('internal server error\n%r', e)
+        return HTTPStatus.INTERNAL_SERVER_ERROR, None, {}
+    if command.upper() != 'GET':
+        return HTTPStatus.OK, response_body, {}
+    etag = '"{}"'.format(blake2b(response_body, digest_size=16).hexdigest())
+    immutable = getattr(obj, 'write_once', False) and isinstance(response, dict) and None not in response.values()
+    response_headers = {'ETag': etag, 'Cache-Control': immutable_cache_control if immutable else 'no-cache'}
+    if etag in [tag.strip().replace('W/', '', 1) for tag in headers.get('if-none-match', '').split(',')]:
+        return HTTPStatus.NOT_MODIFIED, None, response_headers
+    return HTTPStatus.OK, response_body, response_headers
+
+
 class RequestHandler(BaseHTTPRequestHandler):
     server_version = 'CryptHTTP/' + __version__
     default_request_version = 'HTTP/0.9'
@@ -99,52 +205,25 @@ class RequestHandler(BaseHTTPRequestHandler):
                 return
             if not self.parse_request():
                 return
-            try:
-                req_path, _, req_query = self.path.partition('?')
-                req_path = [str(x) for x in unquote(req_path).split('/') if x] if req_path else []
-                req_query = {k: v[0] for (k, v) in parse_qs(req_query, True, False).items()} if req_query else {}
-                req_body = self.rfile.read(int(self.headers.get('content-length', 0))).decode()
-                req_body = loads(req_body) if req_body else {}
-                req_params = dict(req_query, **req_body)
-                req_headers = dict(self.headers)
-            except (AttributeError, IndexError, TypeError) as e:
-                self.log_error('bad request\n%r', e)
-                self.send_error(HTTPStatus.BAD_REQUEST)
-                return
-            if not req_path:
-                req_path = ['info']
-            try:
-                obj = getattr(self.server, req_path[0])
-            except AttributeError:
-                self.log_error('%s not implemented', req_path[0])
-                self.send_error(HTTPStatus.NOT_IMPLEMENTED, req_path[0])
-                return
-            try:
-                func = getattr(obj, 'http_' + self.command.lower())
-            except AttributeError:
-                self.log_error('%s not implemented', self.command.lower())
-                self.send_error(HTTPStatus.NOT_IMPLEMENTED, self.command.lower())
-                return
-            try:
-                response = func(req_path[1:], req_params, req_headers)
-            except AttributeError:
-                self.log_error('%s not implemented', req_path[1])
-                self.send_error(HTTPStatus.NOT_IMPLEMENTED, req_path[1])
-                return
-            try:
-                response = dumps(response or {}).encode()
-                len_message = len(response)
-                self.send_response(HTTPStatus.OK)
-                for k, v in self.http_headers.items():
+            body = self.rfile.read(int(self.headers.get('content-length', 0)))
+            status, response, headers = dispatch_request(self.server, self.command, self.path, body, self.headers,
+                                                         self.log_error)
+            if status == HTTPStatus.NOT_MODIFIED:
+                self.send_response(status)
+                for k, v in headers.items():
                     self.send_header(k, v)
-                self.send_header('Content-Length', len_message)
                 self.end_headers()
-                self.wfile.write(response)
-                self.wfile.flush()
-            except (IndexError, TypeError) as e:
-                self.log_error('internal server error\n%r', e)
-                self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR)
                 return
+            if status != HTTPStatus.OK:
+                self.send_error(status, response)
+                return
+            self.send_response(HTTPStatus.OK)
+            for k, v in dict(self.http_headers, **headers).items():
+                self.send_header(k, v)
+            self.send_header('Content-Length', len(response))
+            self.end_headers()
+            self.wfile.write(response)
+            self.wfile.flush()
         except timeout as e:
             self.log_error("Request timed out: %r", e)
             self.close_connection = True
@@ -152,9 +231,11 @@ class RequestHandler(BaseHTTPRequestHandler):
 
 
 class Server(ThreadingTCPServer):
+    allow_reuse_address = True  # must be set before bind, the server closes pooled keep-alive connections first
+    daemon_threads = True  # pooled clients hold keep-alive connections open, do not wait for them on close
+
     def __init__(self, ip: str, port: int):
         super().__init__(server_address=(ip, port), RequestHandlerClass=RequestHandler, bind_and_activate=True)
-        self.allow_reuse_address = True
         self.server_name = getfqdn(self.server_address[0])
         self.server_port = self.server_address[1]
         self.cmd = RemoteObj(methods={'stop': self.stop, 'info': self.info})
@@ -162,7 +243,7 @@ class Server(ThreadingTCPServer):
     def add_method(self, name: str, obj: RemoteObj) -> None:
         setattr(self, name, obj)
 
-    def add_store(self, name: str, store: Store) -> None:
+    def add_store(self, name: str, store: StoreHandlers) -> None:
         setattr(self, name, store)
 
     def start(self) -> None:
@@ -179,43 +260,373 @@ class Server(ThreadingTCPServer):
         return {'status': 'ok'}
 
 
+class AsyncServer(object):
+    """
+    Server on an asyncio event loop, idle keep-alive connections cost a socket and a coroutine instead of a thread.
+    Registration (add_method, add_store) and the http_<command> handler contract are the same as for Server,
+    handlers run in a thread pool of workers so that slow handlers do not block the loop.
+    """
+    server_version = RequestHandler.server_version
+    sys_version = 'Python/' + python_version.split()[0]
+    http_headers = RequestHandler.http_headers
+    max_headers = 100  # as http.client
+
+    def __init__(self, ip: str, port: int, workers: int = None, idle_timeout: float = None):
+        self.socket = socket(AF_INET, SOCK_STREAM)
+        self.socket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self.socket.bind((ip, port))
+        self.socket.listen(1024)
+        self.socket.setblocking(False)
+        self.server_address = self.socket.getsockname()
+        self.server_name = getfqdn(self.server_address[0])
+        self.server_port = self.server_address[1]
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.idle_timeout = idle_timeout
+        self.loop = None
+        self.stopping = None
+        self.connections = {}
+        self.busy = set()
+        self.cmd = RemoteObj(methods={'stop': self.stop, 'info': self.info})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.server_close()
+
+    def add_method(self, name: str, obj: RemoteObj) -> None:
+        setattr(self, name, obj)
+
+    def add_store(self, name: str, store: StoreHandlers) -> None:
+        setattr(self, name, store)
+
+    def start(self) -> None:
+        thread = Thread(target=self.serve_forever)
+        thread.daemon = False
+        thread.start()
+        print('Server listening on {}:{}'.format(*self.server_address))
+
+    def serve_forever(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self.serve())
+        finally:
+            self.loop.close()
+            self.executor.shutdown(wait=False)
+
+    def stop(self, *args, **kwargs) -> dict:
+        # thread safe, the loop finishes responses in flight (including this one) before closing connections
+        try:
+            if self.stopping is not None:
+                self.loop.call_soon_threadsafe(self.stopping.set)
+        except RuntimeError:
+            pass  # loop already closed
+        return {'status': 'shutdown'}
+
+    def server_close(self) -> None:
+        self.socket.close()
+
+    def info(self, *args, **kwargs) -> dict:
+        return {'status': 'ok'}
+
+    async def serve(self) -> None:
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self.handle_connection, sock=self.socket)
+        await self.stopping.wait()
+        server.close()
+        while self.busy:
+            await asyncio.wait(list(self.busy))
+        for writer in list(self.connections.values()):
+            writer.close()  # idle connections see end of stream and finish
+        await asyncio.gather(*self.connections, return_exceptions=True)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = asyncio.current_task()
+        self.connections[connection] = writer
+        try:
+            while await self.handle_one_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.connections.pop(connection, None)
+            writer.close()
+
+    async def handle_one_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """read, dispatch and answer one request, False once the connection should be closed"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            if not request_line:
+                return False
+            header_lines = await asyncio.wait_for(self.read_header_lines(reader), self.idle_timeout)
+        except ValueError:  # line longer than the stream limit of 64 KiB
+            await self.send_error(writer, HTTPStatus.REQUEST_URI_TOO_LONG)
+            return False
+        if header_lines is None:
+            await self.send_error(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'Too many headers')
+            return False
+        words = request_line.decode('iso-8859-1').split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            await self.send_error(writer, HTTPStatus.BAD_REQUEST)
+            return False
+        command, path, request_version = words
+        headers = parse_headers(BytesIO(b''.join(header_lines)))
+        try:
+            body = await asyncio.wait_for(reader.readexactly(int(headers.get('content-length', 0))), self.idle_timeout)
+        except ValueError:
+            await self.send_error(writer, HTTPStatus.BAD_REQUEST)
+            return False
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection == 'keep-alive' or (request_version >= 'HTTP/1.1' and connection != 'close')
+        done = self.loop.create_future()
+        self.busy.add(done)
+        try:
+            status, response, response_headers = await self.loop.run_in_executor(
+                self.executor, dispatch_request, self, command, path, body, headers, self.log_error)
+            if status == HTTPStatus.NOT_MODIFIED:
+                writer.write(self.response_head(status, None, response_headers))
+            elif status != HTTPStatus.OK:
+                await self.send_error(writer, status, response)
+                return False
+            else:
+                writer.write(self.response_head(status, len(response), dict(self.http_headers, **response_headers))
+                             + response)
+            await writer.drain()
+        finally:
+            self.busy.discard(done)
+            done.set_result(None)
+        return keep_alive
+
+    async def read_header_lines(self, reader: asyncio.StreamReader) -> Union[list, None]:
+        """header lines up to and including the blank line, None if more than max_headers, counted as parse_headers"""
+        header_lines = []
+        while not header_lines or header_lines[-1] not in (b'\r\n', b'\n', b''):
+            if len(header_lines) >= self.max_headers:
+                return None
+            header_lines.append(await reader.readline())
+        return header_lines
+
+    def response_head(self, status: HTTPStatus, content_length: Union[int, None], headers: dict) -> bytes:
+        lines = ['HTTP/1.1 {} {}'.format(status.value, status.phrase),
+                 'Server: {} {}'.format(self.server_version, self.sys_version),
+                 'Date: {}'.format(formatdate(usegmt=True))]
+        lines.extend('{}: {}'.format(k, v) for k, v in headers.items())
+        if content_length is not None:
+            lines.append('Content-Length: {}'.format(content_length))
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'strict')
+
+    async def send_error(self, writer: asyncio.StreamWriter, status: HTTPStatus, message: str = None) -> None:
+        response = dumps({'error': message or status.phrase}).encode()
+        headers = {'Content-Type': 'application/json', 'Connection': 'close'}
+        writer.write(self.response_head(status, len(response), headers) + response)
+        await writer.drain()
+
+    def log_error(self, format: str, *args) -> None:
+        stderr.write('{}:{} - - [{}] {}\n'.format(*self.server_address, formatdate(localtime=True), format % args))
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of keep-alive connections to one (scheme, host, port), safe to share between threads.
+    Connections idle for longer than idle_timeout or closed by the server are dropped when next acquired,
+    acquire blocks while max_size connections are in use.
+    """
+    connection_classes = {'http': HTTPConnection, 'https': HTTPSConnection}
+
+    def __init__(self, host: str, port: int, scheme: str = 'http', timeout: float = 2, max_size: int = 8,
+                 idle_timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.scheme = scheme
+        self.connection_class = self.connection_classes[scheme]
+        self.timeout = timeout
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.idle = deque()
+        self.size = 0
+        self.lock = Condition()
+
+    @staticmethod
+    def healthy(conn: HTTPConnection) -> bool:
+        # an idle keep-alive socket is readable only if the server closed it (or sent something unexpected)
+        if conn.sock is None:
+            return True
+        try:
+            return not select([conn.sock], [], [], 0)[0]
+        except (OSError, ValueError):
+            return False
+
+    def acquire(self) -> HTTPConnection:
+        with self.lock:
+            while True:
+                while self.idle:
+                    conn, last_used = self.idle.pop()
+                    if monotonic() - last_used < self.idle_timeout and self.healthy(conn):
+                        return conn
+                    conn.close()
+                    self.size -= 1
+                if self.size < self.max_size:
+                    self.size += 1
+                    break
+                self.lock.wait()
+        return self.connection_class(host=self.host, port=self.port, timeout=self.timeout)
+
+    def release(self, conn: HTTPConnection, reuse: bool = True) -> None:
+        with self.lock:
+            if reuse:
+                self.idle.append((conn, monotonic()))
+            else:
+                conn.close()
+                self.size -= 1
+            self.lock.notify()
+
+    def close(self) -> None:
+        """close idle connections, connections in use are closed when released"""
+        with self.lock:
+            while self.idle:
+                self.idle.pop()[0].close()
+                self.size -= 1
+
+
+connection_pools = {}
+connection_pools_lock = Lock()
+
+
+def get_connection_pool(host: str, port: int, scheme: str = 'http', timeout: float = 2, **kwargs) -> ConnectionPool:
+    """shared pool per (scheme, host, port), kwargs (max_size, idle_timeout) apply when the pool is created"""
+    with connection_pools_lock:
+        pool = connection_pools.get((scheme, host, port))
+        if pool is None:
+            pool = connection_pools[(scheme, host, port)] = ConnectionPool(host, port, scheme, timeout, **kwargs)
+        return pool
+
+
+class ResponseCache(object):
+    """
+    Bounded lru cache of get responses by (scheme, host, port, url), safe to share between clients and threads.
+    Responses marked immutable are served without a request, others are revalidated with their etag.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (scheme, host, port, url) -> (etag, immutable, response body)
+        self.lock = Lock()
+        self.counts = {'hits': 0, 'revalidated': 0, 'misses': 0}
+
+    def get(self, key: Tuple[str, str, int, str]) -> Union[Tuple[str, bool, bytes], None]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple[str, str, int, str], response: HTTPResponse, data: bytes) -> None:
+        etag = response.headers.get('etag')
+        immutable = 'immutable' in response.headers.get('cache-control', '')
+        if etag is None and not immutable:
+            return
+        with self.lock:
+            self.entries[key] = (etag, immutable, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def count(self, outcome: str) -> None:
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counts, entries=len(self.entries))
+
+
 class Client(object):
     http_headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
 
-    def __init__(self, ip: str, port: int, timeout: int = 2):
+    def __init__(self, ip: str, port: int, timeout: int = 2, scheme: str = 'http', pool: ConnectionPool = None,
+                 cache: ResponseCache = None):
         self.ip = ip
         self.port = port
         self.timeout = timeout
+        self.pool = pool or get_connection_pool(ip, port, scheme, timeout)
+        self.cache = cache
 
     def __enter__(self):
-        self.conn = HTTPConnection(host=self.ip, port=self.port, timeout=self.timeout)
-        self.conns = HTTPSConnection(host=self.ip, port=self.port)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.conn.close()
+        pass  # connections stay in the pool for the next client
 
-    def get_response(self):
-        response = self.conn.getresponse()
+    @staticmethod
+    def send(conn: HTTPConnection, method: str, url: str, body: str = None, headers: dict = None) -> HTTPResponse:
+        reused = conn.sock is not None
+        try:
+            conn.request(method=method, url=url, body=body, headers=headers or {})
+            return conn.getresponse()
+        except (BrokenPipeError, ConnectionAbortedError, ConnectionResetError, RemoteDisconnected):
+            if not reused:
+                raise
+        # the server closed the keep-alive connection after the health check, reconnect once
+        conn.close()
+        conn.request(method=method, url=url, body=body, headers=headers or {})
+        return conn.getresponse()
+
+    def fetch(self, method: str, url: str, body: str = None, headers: dict = None) -> Tuple[HTTPResponse, bytes]:
+        conn = self.pool.acquire()
+        try:
+            response = self.send(conn, method, url, body, headers)
+            data = response.read()
+        except BaseException:
+            self.pool.release(conn, reuse=False)
+            raise
+        self.pool.release(conn, reuse=not response.will_close)
+        return response, data
+
+    def request(self, method: str, url: str, body: str = None, headers: dict = None) -> dict:
+        return self.get_response(*self.fetch(method, url, body, headers))
+
+    @staticmethod
+    def get_response(response: HTTPResponse, data: bytes) -> dict:
         if response.status == HTTPStatus.OK:
             if response.headers.get('content-type') == 'application/json':
-                return loads(response.read())
+                return loads(data)
             else:
-                raise HTTPException('server returned non json response {}'.format(response.read()))
+                raise HTTPException('server returned non json response {}'.format(data))
         else:
             raise HTTPException('server returned code {} {}'.format(response.status, response.reason))
 
     def get(self, path: str, query_params: dict = None) -> dict:
-        self.conn.request(method='GET', url=path + (('?' + urlencode(query_params)) if query_params else ''))
-        return self.get_response()
+        url = path + (('?' + urlencode(query_params)) if query_params else '')
+        if self.cache is None:
+            return self.request(method='GET', url=url)
+        cache_key = (self.pool.scheme, self.pool.host, self.pool.port, url)
+        cached = self.cache.get(cache_key)
+        if cached is not None and cached[1]:
+            self.cache.count('hits')
+            return loads(cached[2])
+        response, data = self.fetch(method='GET', url=url,
+                                    headers={'If-None-Match': cached[0]} if cached is not None else None)
+        if response.status == HTTPStatus.NOT_MODIFIED and cached is not None:
+            self.cache.count('revalidated')
+            return loads(cached[2])
+        self.cache.count('misses')
+        result = self.get_response(response, data)
+        self.cache.put(cache_key, response, data)
+        return result
 
     def put(self, path: str, query_params: dict = None) -> dict:
-        self.conn.request(method='PUT', url=path, body=dumps(query_params or {}), headers=self.http_headers)
-        return self.get_response()
+        return self.request(method='PUT', url=path, body=dumps(query_params or {}), headers=self.http_headers)
 
     def post(self, path: str, query_params: dict = None) -> dict:
-        self.conn.request(method='POST', url=path, body=dumps(query_params or {}), headers=self.http_headers)
-        return self.get_response()
+        return self.request(method='POST', url=path, body=dumps(query_params or {}), headers=self.http_headers)
+
+    def get_many(self, path: str, keys: Iterable[str]) -> dict:
+        """get keys under the store path in one round trip, {key: {'status': 'found'|'missing', 'value': ...}}"""
+        return self.post(path, {'get': list(keys)})['get']
+
+    def put_many(self, path: str, values: dict) -> dict:
+        """put {key: value} under the store path in one round trip, {key: {'status': 'created'|'exists', ...}}"""
+        return self.post(path, {'put': values})['put']
 
 
 if __name__ == '__main__':
@@ -224,11 +635,16 @@ if __name__ == '__main__':
     ip = '127.0.0.1'
     port = 50124
     args = argv[1:]
+    server_class = Server
+    if args and args[0].endswith('-async'):
+        server_class = AsyncServer
+        args[0] = args[0][:-len('-async')]
     if not args:
         with Client(ip, port) as c:
             print(c.get('/'))
     elif args[0] == 'start':
-        s = Server(ip=ip, port=port)
+        s = server_class(ip=ip, port=port)
+        s.add_method('metrics', metrics)
         s.start()
     elif args[0] == 'stop':
         with Client(ip, port) as c:
@@ -237,15 +653,17 @@ if __name__ == '__main__':
         with Client(ip, port) as c:
             print(c.get('/cmd/status'))
     elif args[0] == 'test':
-        with Server(ip=ip, port=port) as s:
+        with server_class(ip=ip, port=port) as s:
             s.add_store('shares', Store())
+            s.add_method('metrics', metrics)
+            metrics.enable()
             s.start()
             with Client(ip, port) as c:
                 try:
                     c.put('/shares/a', {'value': {'x': 1, 'y': 1}})
                 except Exception as e:
                     print(e)
-                for x in ('/cmd/info', '/shares/', '/shares/a', '/cmd/xshutdown', '/cmd/stop'):
+                for x in ('/cmd/info', '/shares/', '/shares/a', '/cmd/xshutdown', '/metrics/', '/cmd/stop'):
                     try:
                         print(c.get(x))
                     except Exception as e:
@@ -35,40 +35,444 @@
 ########################################################################################################################
 
 import base64
-import io
+import collections
+import struct
+import threading
 import typing
 
 from Crypto.Cipher import AES, PKCS1_OAEP
-from Crypto.PublicKey import RSA
+from Crypto.Hash import SHA256
+from Crypto.Protocol.DH import key_agreement
+from Crypto.Protocol.KDF import HKDF
+from Crypto.PublicKey import ECC, RSA
 from Crypto.Random import get_random_bytes
 
-PrivateKey = typing.Union[str, RSA.RsaKey]
-PublicKey = typing.Union[str, RSA.RsaKey]
+try:
+    from .metrics import metrics
+except ImportError:
+    from metrics import metrics
+
+PrivateKey = typing.Union[str, RSA.RsaKey, ECC.EccKey]
+PublicKey = typing.Union[str, RSA.RsaKey, ECC.EccKey]
+
+# binary envelope: header (magic, version, key type, length of wrapped key), wrapped key, nonce, tag and cipher text
+envelope_header = struct.Struct('>2sBBH')
+envelope_magic = b'CE'
+envelope_version = 1
+key_type_rsa = 0
+key_type_x25519 = 1
+key_types = {'rsa': key_type_rsa, 'x25519': key_type_x25519}
+key_flag_shared = 0x80  # set in the key type of envelopes whose data key is shared by an encryption session
+nonce_size = tag_size = 16
+
+# encrypted stream: envelope header with stream magic, wrapped key and nonce prefix, then records of a length word
+# (top bit set on the final record), cipher text and tag; each record nonce is the prefix, record counter and final flag
+stream_magic = b'CS'
+stream_chunk_size = 64 * 1024
+stream_prefix_size = 11
+stream_record_header = struct.Struct('>I')
+stream_final_flag = 0x80000000
+
+
+def generate_key(key_type: str = 'rsa') -> typing.Union[RSA.RsaKey, ECC.EccKey]:
+    """new private key, rsa 2048 or x25519"""
+    if key_types[key_type] == key_type_x25519:
+        return ECC.generate(curve='Curve25519')
+    return RSA.generate(2048)
+
+
+def import_key(key: typing.Union[str, bytes]) -> typing.Union[RSA.RsaKey, ECC.EccKey]:
+    """parse exported rsa or x25519 key"""
+    try:
+        return RSA.import_key(key)
+    except ValueError:
+        return ECC.import_key(key)
+
+
+def export_private_key(key: typing.Union[RSA.RsaKey, ECC.EccKey]) -> str:
+    if isinstance(key, RSA.RsaKey):
+        return key.export_key().decode()
+    return key.export_key(format='PEM')
+
+
+def export_public_key(key: typing.Union[RSA.RsaKey, ECC.EccKey]) -> str:
+    """openssh format for rsa keys, pem for x25519 keys (which have no openssh format)"""
+    if isinstance(key, RSA.RsaKey):
+        return key.publickey().export_key(format='OpenSSH').decode()
+    return key.public_key().export_key(format='PEM')
+
+
+class X25519Cipher(object):
+    """
+    ecies style data key wrap: ephemeral x25519 key agreement, hkdf sha256 and aes gcm
+    wrapped key is the ephemeral public key, the encrypted data key and the gcm tag
+    """
+    kdf_info = b'x25519 data key wrap'
+
+    def __init__(self, key: ECC.EccKey):
+        self.key = key
+        self.public_bytes = key.public_key().export_key(format='raw')
+
+    def kek(self, shared_secret: bytes, ephemeral_public_bytes: bytes) -> bytes:
+        return HKDF(shared_secret, 32, ephemeral_public_bytes + self.public_bytes, SHA256, context=self.kdf_info)
+
+    def encrypt(self, encryption_key: bytes) -> bytes:
+        ephemeral_key = ECC.generate(curve='Curve25519')
+        ephemeral_public_bytes = ephemeral_key.public_key().export_key(format='raw')
+        kek = key_agreement(static_pub=self.key.public_key(), eph_priv=ephemeral_key,
+                            kdf=lambda shared_secret: self.kek(shared_secret, ephemeral_public_bytes))
+        # every kek is used exactly once, so a constant nonce is safe
+        enc_encryption_key, tag = AES.new(kek, AES.MODE_GCM, nonce=bytes(12)).encrypt_and_digest(encryption_key)
+        return ephemeral_public_bytes + enc_encryption_key + tag
+
+    def decrypt(self, wrapped_key: bytes) -> bytes:
+        ephemeral_public_bytes = bytes(wrapped_key[:32])
+        ephemeral_key = ECC.construct(curve='Curve25519', point_x=int.from_bytes(ephemeral_public_bytes, 'little'))
+        kek = key_agreement(static_priv=self.key, eph_pub=ephemeral_key,
+                            kdf=lambda shared_secret: self.kek(shared_secret, ephemeral_public_bytes))
+        return AES.new(kek, AES.MODE_GCM, nonce=bytes(12)).decrypt_and_verify(wrapped_key[32:-16], wrapped_key[-16:])
+
+
+class KeyRegistry(object):
+    """bounded lru cache of parsed keys, their key type and wrapping cipher objects, keyed by key fingerprint"""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.data_keys = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(key: typing.Union[PrivateKey, PublicKey]) -> bytes:
+        """sha256 of the key modulus, exponent and type or of the x25519 public point if parsed, else of the key"""
+        if isinstance(key, RSA.RsaKey):
+            material = b'%d:%x:%x' % (key.has_private(), key.e, key.n)
+        elif isinstance(key, ECC.EccKey):
+            material = b'%d:x25519:' % key.has_private() + key.public_key().export_key(format='raw')
+        else:
+            material = key.encode() if isinstance(key, str) else key
+        return SHA256.new(material).digest()
+
+    def entry(self, key: typing.Union[PrivateKey, PublicKey]) -> list:
+        fingerprint = self.fingerprint(key)
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            if entry is not None:
+                self.entries.move_to_end(fingerprint)
+                return entry
+        with metrics.stage('key_import'):
+            parsed_key = key if isinstance(key, (RSA.RsaKey, ECC.EccKey)) else import_key(key)
+        if isinstance(parsed_key, RSA.RsaKey):
+            entry = [parsed_key, PKCS1_OAEP.new(parsed_key), key_type_rsa]
+        else:
+            entry = [parsed_key, X25519Cipher(parsed_key), key_type_x25519]
+        with self.lock:
+            self.entries[fingerprint] = entry
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def get_key(self, key: typing.Union[PrivateKey, PublicKey]) -> typing.Union[RSA.RsaKey, ECC.EccKey]:
+        """parsed key"""
+        return self.entry(key)[0]
+
+    def get_cipher(self, key: typing.Union[PrivateKey, PublicKey]) -> typing.Any:
+        """pkcs1 oaep (rsa) or x25519 cipher object wrapping data keys for key"""
+        return self.entry(key)[1]
+
+    def get_key_type(self, key: typing.Union[PrivateKey, PublicKey]) -> int:
+        return self.entry(key)[2]
+
+    def unwrap(self, private_key: PrivateKey, enc_encryption_key: bytes) -> bytes:
+        """decrypt a wrapped data key, reusing the result for messages of the same encryption session"""
+        parsed_key, cipher = self.entry(private_key)[:2]
+        cache_key = self.fingerprint(parsed_key) + enc_encryption_key
+        with self.lock:
+            encryption_key = self.data_keys.get(cache_key)
+            if encryption_key is not None:
+                self.data_keys.move_to_end(cache_key)
+                return encryption_key
+        with metrics.stage('unwrap'):
+            encryption_key = cipher.decrypt(enc_encryption_key)
+        with self.lock:
+            self.data_keys[cache_key] = encryption_key
+            while len(self.data_keys) > self.max_size:
+                self.data_keys.popitem(last=False)
+        return encryption_key
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.data_keys.clear()
+
+
+key_registry = KeyRegistry()
+
+
+def pack_envelope(enc_encryption_key: bytes, nonce: bytes, tag: bytes, cipher_text: bytes,
+                  key_type: int = key_type_rsa) -> bytes:
+    """binary envelope with versioned header"""
+    header = envelope_header.pack(envelope_magic, envelope_version, key_type, len(enc_encryption_key))
+    return b''.join((header, enc_encryption_key, nonce, tag, cipher_text))
+
+
+def unpack_envelope(envelope: bytes,
+                    key_size: int) -> typing.Tuple[int, memoryview, memoryview, memoryview, memoryview]:
+    """
+    key type, wrapped key, nonce, tag and cipher text as slices of envelope without copying
+    envelopes without header (wrapped key of key_size bytes, nonce, tag and cipher text) are read as rsa envelopes
+    """
+    view = memoryview(envelope)
+    offset, key_type, wrapped_len = 0, key_type_rsa, key_size
+    if len(view) >= envelope_header.size:
+        magic, version, header_key_type, header_wrapped_len = envelope_header.unpack_from(view)
+        if magic == envelope_magic and version == envelope_version and (header_key_type != key_type_rsa or
+                                                                        header_wrapped_len == key_size):
+            offset, key_type, wrapped_len = envelope_header.size, header_key_type, header_wrapped_len
+    nonce_offset = offset + wrapped_len
+    tag_offset = nonce_offset + nonce_size
+    text_offset = tag_offset + tag_size
+    if len(view) < text_offset:
+        raise ValueError('envelope too short')
+    return (key_type, view[offset:nonce_offset], view[nonce_offset:tag_offset], view[tag_offset:text_offset],
+            view[text_offset:])
+
+
+def shares_data_key(envelope: bytes) -> bool:
+    """true for envelopes of an encryption session, whose data key also protects other messages"""
+    return (len(envelope) >= envelope_header.size and envelope[:2] == envelope_magic and
+            envelope[2] == envelope_version and bool(envelope[3] & key_flag_shared))
+
+
+def unwrap_envelope(envelope: bytes,
+                    private_key: PrivateKey) -> typing.Tuple[bytes, memoryview, memoryview, memoryview]:
+    """data key, nonce, tag and cipher text of binary envelope"""
+    parsed_key, _, private_key_type = key_registry.entry(private_key)
+    key_size = parsed_key.size_in_bytes() if private_key_type == key_type_rsa else 0
+    key_type, enc_encryption_key, nonce, tag, cipher_text = unpack_envelope(envelope, key_size)
+    if key_type & ~key_flag_shared != private_key_type:
+        raise ValueError('envelope key type {} does not match private key type {}'.format(key_type, private_key_type))
+    return key_registry.unwrap(parsed_key, enc_encryption_key), nonce, tag, cipher_text
+
+
+def decrypt_envelope(envelope: bytes, private_key: PrivateKey) -> bytes:
+    """decrypt binary envelope using private key"""
+    encryption_key, nonce, tag, cipher_text = unwrap_envelope(envelope, private_key)
+    with metrics.stage('aes_decrypt'):
+        cipher_aes = AES.new(encryption_key, AES.MODE_EAX, nonce)
+        return cipher_aes.decrypt_and_verify(cipher_text, tag)
+
+
+def encrypt_envelope(msg: bytes, public_key: PublicKey) -> bytes:
+    """encrypt msg using public key into binary envelope"""
+    _, cipher, key_type = key_registry.entry(public_key)
+    encryption_key = get_random_bytes(32)
+    with metrics.stage('aes_encrypt'):
+        cipher_aes = AES.new(encryption_key, AES.MODE_EAX)
+        cipher_text, tag = cipher_aes.encrypt_and_digest(msg)
+    with metrics.stage('wrap'):
+        enc_encryption_key = cipher.encrypt(encryption_key)
+    return pack_envelope(enc_encryption_key, cipher_aes.nonce, tag, cipher_text, key_type)
 
 
 def decrypt(msg: str, private_key: PrivateKey) -> str:
-    """decrypt (encrypted) msg using private key"""
-    rsa_key = private_key if isinstance(private_key, RSA.RsaKey) else RSA.import_key(private_key)
-    key_size = rsa_key.size_in_bytes()
-    enc_msg = io.BytesIO(base64.b64decode(msg.encode()))
-    enc_encryption_key, nonce, tag, cipher_text = [enc_msg.read(size) for size in (key_size, 16, 16, -1)]
-    encryption_key = PKCS1_OAEP.new(rsa_key).decrypt(enc_encryption_key)
-    cipher_aes = AES.new(encryption_key, AES.MODE_EAX, nonce)
-    return cipher_aes.decrypt_and_verify(cipher_text, tag).decode()
+    """decrypt (encrypted, base64 encoded) msg using private key"""
+    with metrics.stage('decrypt'):
+        with metrics.stage('base64_decode'):
+            envelope = base64.b64decode(msg)
+        return decrypt_envelope(envelope, private_key).decode()
 
 
 def encrypt(msg: str, public_key: PublicKey) -> str:
-    """encrypt msg using public key"""
+    """encrypt msg using public key, base64 encoded"""
+    with metrics.stage('encrypt'):
+        envelope = encrypt_envelope(msg.encode(), public_key)
+        with metrics.stage('base64_encode'):
+            return base64.b64encode(envelope).decode()
+
+
+def rewrap_envelope(envelope: bytes, private_key: PrivateKey, public_key: PublicKey) -> bytes:
+    """
+    rewrap the data key of binary envelope for public key, leaving nonce, tag and cipher text untouched
+    envelopes of an encryption session are decrypted and encrypted under a fresh data key instead, as their data key
+    also protects the other messages of the session
+    """
+    if shares_data_key(envelope):
+        return encrypt_envelope(decrypt_envelope(envelope, private_key), public_key)
+    encryption_key, nonce, tag, cipher_text = unwrap_envelope(envelope, private_key)
+    _, cipher, key_type = key_registry.entry(public_key)
+    with metrics.stage('wrap'):
+        enc_encryption_key = cipher.encrypt(encryption_key)
+    return pack_envelope(enc_encryption_key, nonce, tag, cipher_text, key_type)
+
+
+def rewrap(msg: str, private_key: PrivateKey, public_key: PublicKey) -> str:
+    """rewrap (encrypted, base64 encoded) msg for public key without decrypting its cipher text"""
+    with metrics.stage('rewrap'):
+        with metrics.stage('base64_decode'):
+            envelope = base64.b64decode(msg)
+        envelope = rewrap_envelope(envelope, private_key, public_key)
+        with metrics.stage('base64_encode'):
+            return base64.b64encode(envelope).decode()
+
+
+class EncryptionSession(object):
+    """
+    one wrapped data key per (sender, recipient, batch), each message encrypted with a fresh aes nonce
+    messages can be decrypted with decrypt like those of encrypt, their envelopes are flagged as sharing the data key
+    """
+
+    def __init__(self, public_key: PublicKey):
+        _, cipher, self.key_type = key_registry.entry(public_key)
+        self.encryption_key = get_random_bytes(32)
+        with metrics.stage('wrap'):
+            self.enc_encryption_key = cipher.encrypt(self.encryption_key)
+
+    def encrypt_envelope(self, msg: bytes) -> bytes:
+        """encrypt msg with the session data key into binary envelope"""
+        with metrics.stage('aes_encrypt'):
+            cipher_aes = AES.new(self.encryption_key, AES.MODE_EAX)
+            cipher_text, tag = cipher_aes.encrypt_and_digest(msg)
+        return pack_envelope(self.enc_encryption_key, cipher_aes.nonce, tag, cipher_text,
+                             self.key_type | key_flag_shared)
+
+    def encrypt(self, msg: str) -> str:
+        """encrypt msg with the session data key, base64 encoded"""
+        with metrics.stage('encrypt'):
+            envelope = self.encrypt_envelope(msg.encode())
+            with metrics.stage('base64_encode'):
+                return base64.b64encode(envelope).decode()
+
+
+def open_sessions(public_keys: typing.Iterable[PublicKey]) -> typing.Dict[PublicKey, EncryptionSession]:
+    """one encryption session per recipient public key"""
+    return {public_key: EncryptionSession(public_key) for public_key in public_keys}
+
+
+def decrypt_and_encrypt(enc_msg: str, private_key: PrivateKey, public_key: PublicKey,
+                        session: EncryptionSession = None) -> str:
+    """
+    rewrap (encrypted) msg for public key, or decrypt and (re)encrypt using session for public key if provided
+    the recipient never learns the data key of another msg, see rewrap_envelope
+    """
+    with metrics.stage('decrypt_and_encrypt'):
+        if session is not None:
+            return session.encrypt(decrypt(msg=enc_msg, private_key=private_key))
+        return rewrap(msg=enc_msg, private_key=private_key, public_key=public_key)
+
+
+class StreamReader(object):
+    """file like read(size) over an iterator of byte strings"""
+
+    def __init__(self, chunks: typing.Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+
+    def read(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+def as_reader(source: typing.Union[typing.BinaryIO, typing.Iterable[bytes]]) -> typing.Any:
+    return source if hasattr(source, 'read') else StreamReader(source)
+
+
+def read_full(reader: typing.Any, size: int) -> bytes:
+    """read size bytes from reader, shorter only at end of stream, as pipes, sockets and raw files may read less"""
+    data = reader.read(size)
+    if len(data) == size or not data:
+        return data
+    data = bytearray(data)
+    while len(data) < size:
+        chunk = reader.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+def stream_cipher(encryption_key: bytes, prefix: bytes, counter: int, final: bool, header_digest: bytes) -> typing.Any:
+    cipher_aes = AES.new(encryption_key, AES.MODE_EAX, prefix + counter.to_bytes(4, 'big') + bytes((final,)))
+    cipher_aes.update(header_digest)
+    return cipher_aes
+
+
+def encrypt_stream(source: typing.Union[typing.BinaryIO, typing.Iterable[bytes]], public_key: PublicKey,
+                   chunk_size: int = stream_chunk_size) -> typing.Iterator[bytes]:
+    """
+    encrypt binary stream or iterator of bytes using public key, generating the stream header and then one
+    authenticated record per chunk, the last record being flagged final so that truncation is detected
+    """
+    _, cipher, key_type = key_registry.entry(public_key)
     encryption_key = get_random_bytes(32)
-    rsa_key = public_key if isinstance(public_key, RSA.RsaKey) else RSA.import_key(public_key)
-    enc_encryption_key = PKCS1_OAEP.new(rsa_key).encrypt(encryption_key)
-    cipher_aes = AES.new(encryption_key, AES.MODE_EAX)
-    cipher_text, tag = cipher_aes.encrypt_and_digest(msg.encode())
-    return base64.b64encode(enc_encryption_key + cipher_aes.nonce + tag + cipher_text).decode()
-
-
-def decrypt_and_encrypt(enc_msg: str, private_key: PrivateKey, public_key: PublicKey) -> str:
-    """decrypt (encrypted) msg and (re)encrypt using public key"""
-    decryption_private_key = private_key if isinstance(private_key, RSA.RsaKey) else RSA.import_key(private_key)
-    encryption_public_key = public_key if isinstance(public_key, RSA.RsaKey) else RSA.import_key(public_key)
-    return encrypt(msg=decrypt(msg=enc_msg, private_key=decryption_private_key), public_key=encryption_public_key)
+    with metrics.stage('wrap'):
+        enc_encryption_key = cipher.encrypt(encryption_key)
+    prefix = get_random_bytes(stream_prefix_size)
+    header = b''.join((envelope_header.pack(stream_magic, envelope_version, key_type, len(enc_encryption_key)),
+                       enc_encryption_key, prefix))
+    header_digest = SHA256.new(header).digest()
+    yield header
+    reader = as_reader(source)
+    chunk = read_full(reader, chunk_size)
+    for counter in range(2 ** 32):
+        next_chunk = read_full(reader, chunk_size) if len(chunk) == chunk_size else b''
+        final = not next_chunk
+        with metrics.stage('aes_encrypt_stream'):
+            cipher_aes = stream_cipher(encryption_key, prefix, counter, final, header_digest)
+            cipher_text, tag = cipher_aes.encrypt_and_digest(chunk)
+        yield stream_record_header.pack(len(cipher_text) | (stream_final_flag if final else 0)) + cipher_text + tag
+        if final:
+            break
+        chunk = next_chunk
+    else:
+        raise OverflowError('stream has too many chunks')
+
+
+def decrypt_stream(source: typing.Union[typing.BinaryIO, typing.Iterable[bytes]], private_key: PrivateKey,
+                   max_chunk_size: int = stream_chunk_size) -> typing.Iterator[bytes]:
+    """
+    decrypt stream from encrypt_stream using private key, generating each chunk once its record is authenticated
+    raises ValueError on a tampered, reordered or truncated stream, or on a record longer than max_chunk_size, which
+    must be at least the chunk_size the stream was encrypted with
+    """
+    reader = as_reader(source)
+    parsed_key, _, private_key_type = key_registry.entry(private_key)
+    header = read_full(reader, envelope_header.size)
+    if len(header) < envelope_header.size:
+        raise ValueError('stream too short')
+    magic, version, key_type, wrapped_len = envelope_header.unpack(header)
+    if magic != stream_magic or version != envelope_version:
+        raise ValueError('not an encrypted stream')
+    if key_type != private_key_type:
+        raise ValueError('stream key type {} does not match private key type {}'.format(key_type, private_key_type))
+    enc_encryption_key, prefix = read_full(reader, wrapped_len), read_full(reader, stream_prefix_size)
+    if len(prefix) < stream_prefix_size:
+        raise ValueError('stream too short')
+    header_digest = SHA256.new(header + enc_encryption_key + prefix).digest()
+    encryption_key = key_registry.unwrap(parsed_key, enc_encryption_key)
+    for counter in range(2 ** 32):
+        record_header = read_full(reader, stream_record_header.size)
+        if len(record_header) < stream_record_header.size:
+            raise ValueError('stream truncated')
+        length, = stream_record_header.unpack(record_header)
+        final = bool(length & stream_final_flag)
+        length &= ~stream_final_flag
+        if length > max_chunk_size:
+            raise ValueError('stream record longer than {} bytes'.format(max_chunk_size))
+        record = memoryview(read_full(reader, length + tag_size))
+        if len(record) < length + tag_size:
+            raise ValueError('stream truncated')
+        with metrics.stage('aes_decrypt_stream'):
+            cipher_aes = stream_cipher(encryption_key, prefix, counter, final, header_digest)
+            chunk = cipher_aes.decrypt_and_verify(record[:length], record[length:])
+        yield chunk
+        if final:
+            if reader.read(1):
+                raise ValueError('data after final record')
+            break
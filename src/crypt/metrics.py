@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   crypt/metrics.py:
+#
+########################################################################################################################
+#    Author: Vikas Munshi <vikas.munshi@gmail.com>
+#    Version 0.0.1: 2018.05.24
+#
+#    source: https://github.com/vikasmunshi/python-scripts/tree/master/src/
+#    set-up: bash <(curl -s https://github.com/vikasmunshi/python-scripts/tree/master/src/setup.sh)
+#
+########################################################################################################################
+#    MIT License
+#
+#    Copyright (c) 2018 Vikas Munshi
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+########################################################################################################################
+
+import json
+import os
+import threading
+import time
+import typing
+
+histogram_buckets = 32  # bucket i counts latencies of less than 2**i microseconds, the last bucket everything slower
+
+
+class NullStage(object):
+    """stage context manager used while metrics are disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+null_stage = NullStage()
+
+
+class Stage(object):
+    """stage context manager recording its latency on exit"""
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+
+
+class Metrics(object):
+    """opt-in counts and latency histograms per stage, enabled by enable() or the CRYPT_METRICS environment variable"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stages.clear()
+
+    def stage(self, name: str) -> typing.Union[Stage, NullStage]:
+        """context manager timing the enclosed block as stage name, a shared no-op while disabled"""
+        return Stage(self, name) if self.enabled else null_stage
+
+    def record(self, name: str, seconds: float) -> None:
+        bucket = min(int(seconds * 1e6).bit_length(), histogram_buckets - 1)
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = [0, 0.0, 0.0, [0] * histogram_buckets]
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], seconds)
+            stage[3][bucket] += 1
+
+    def snapshot(self) -> typing.Dict[str, dict]:
+        """count, total, mean and max seconds and non-empty histogram buckets (by upper bound in us) per stage"""
+        with self.lock:
+            stages = {name: (count, total, slowest, list(histogram))
+                      for name, (count, total, slowest, histogram) in self.stages.items()}
+        return {name: {'count': count, 'total_seconds': total, 'mean_seconds': total / count, 'max_seconds': slowest,
+                       'histogram_us': {('<{}'.format(2 ** i) if i < histogram_buckets - 1 else 'slower'): hits
+                                        for i, hits in enumerate(histogram) if hits}}
+                for name, (count, total, slowest, histogram) in sorted(stages.items())}
+
+    def dump(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def http_get(self, args: list, params: dict, headers: dict) -> dict:
+        """snapshot of all stages, or of stage args[0], for crypt.comm Server.add_method"""
+        snapshot = self.snapshot()
+        return {args[0]: snapshot.get(args[0])} if args else snapshot
+
+    def http_put(self, args: list, params: dict, headers: dict) -> dict:
+        """enable, disable or reset via crypt.comm"""
+        if args and args[0] in ('enable', 'disable', 'reset'):
+            getattr(self, args[0])()
+        return {'enabled': self.enabled}
+
+    getters = []
+    putters = []
+
+
+metrics = Metrics(enabled=bool(os.environ.get('CRYPT_METRICS')))
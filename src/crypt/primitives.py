@@ -34,13 +34,18 @@
 #    SOFTWARE.
 ########################################################################################################################
 
-import binascii
 import collections
 import functools
 import random
 import string
+import struct
 import typing
 
+try:
+    from .arithmetic import decode, evaluate, evaluate_vectors, interpolate, interpolate_vectors, modulo_inverse
+except ImportError:
+    from arithmetic import decode, evaluate, evaluate_vectors, interpolate, interpolate_vectors, modulo_inverse
+
 Share = collections.namedtuple('Share', 'n m x y')
 rand = random.SystemRandom()
 
@@ -59,36 +64,67 @@ def get_smallest_prime(x: int) -> int:
     raise IndexError(x)
 
 
+# secrets longer than chunked_threshold bytes are split chunk by chunk over the fixed field chunk_prime
+chunk_size = 64
+chunk_prime = mersenne_num(521)
+chunked_threshold = 1024
+
+# share streams are a header (n, m, x) followed by field elements of fixed size, written in blocks of stream_block_size
+stream_header = struct.Struct('>HHI')
+stream_element_size = (chunk_prime.bit_length() + 7) // 8
+stream_block_size = 1024 * chunk_size
+
+
+def bytes_to_chunks(bytes_arg: bytes, pad: bool = True) -> typing.Tuple[int, ...]:
+    """map bytes, padded to a multiple of chunk_size, to a vector of ints in field chunk_prime"""
+    if pad:
+        bytes_arg += b'\x80' + bytes(-(len(bytes_arg) + 1) % chunk_size)
+    return tuple(int.from_bytes(bytes_arg[i:i + chunk_size], 'big') for i in range(0, len(bytes_arg), chunk_size))
+
+
+def chunks_to_bytes(chunks: typing.Sequence[int]) -> bytes:
+    """reverse map vector of ints to bytes"""
+    bytes_arg = b''.join(chunk.to_bytes(chunk_size, 'big') for chunk in chunks)
+    return bytes_arg[:bytes_arg.rindex(b'\x80')]
+
+
+def bytes_to_int(bytes_arg: bytes) -> int:
+    """map bytes to int, framed with a leading 0x01 byte so that leading zero bytes survive"""
+    return int.from_bytes(b'\x01' + bytes_arg, 'big')
+
+
+def int_to_bytes(int_arg: int) -> bytes:
+    """reverse map int to bytes"""
+    bytes_arg = int_arg.to_bytes((int_arg.bit_length() + 7) // 8, 'big')
+    if bytes_arg[:1] != b'\x01':
+        raise ValueError('int is not framed bytes')
+    return bytes_arg[1:]
+
+
 def str_to_int(str_arg: str) -> int:
     """map string to int"""
-    return int(binascii.hexlify(str_arg.encode('utf-8')), 16)
+    return int.from_bytes(str_arg.encode('utf-8'), 'big')
 
 
 def int_to_str(int_arg: int) -> str:
     """reverse map int to string"""
-    return binascii.unhexlify(format(int_arg, 'x')).decode('utf-8')
+    return int_arg.to_bytes((int_arg.bit_length() + 7) // 8, 'big').decode('utf-8')
 
 
-def modulo_inverse(x: int, n: int) -> int:
-    """multiplicative inverse of x in modulo group n"""
-
-    def egcd(a: int, b: int) -> typing.Tuple[int, int, int]:
-        """Euler's extended algorithm for GCD"""
-        if a == 0:
-            return b, 0, 1
-        else:
-            g, y, x = egcd(b % a, a)
-            return g, x - (b // a) * y, y
-
-    return (n + egcd(n, abs(x % n))[2]) % n
+def secret_to_str(secret: typing.Union[int, bytes]) -> str:
+    """decode merged secret, ints that are not framed bytes are unframed strings split by earlier versions"""
+    if isinstance(secret, bytes):
+        return secret.decode('utf-8')
+    try:
+        secret = int_to_bytes(secret)
+    except ValueError:
+        return int_to_str(secret)
+    return secret.decode('utf-8')
 
 
 def polynomial(x: int, coefficients: typing.Sequence[int], n: int) -> int:
     """value at x of polynomial with given coefficients in modulo field n"""
-    y = 0
-    for i, a in enumerate(coefficients):
-        y = (y + (a * (x ** i) % n) % n) % n
-    return y
+    return evaluate(coefficients, (x,), n)[0]
 
 
 def get_random_str(length: int = 32) -> str:
@@ -96,34 +132,179 @@ def get_random_str(length: int = 32) -> str:
     return ''.join([rand.choice(string.ascii_letters + string.digits) for _ in range(length)])
 
 
+def get_x_vals(num_shares: int) -> typing.Tuple[int, ...]:
+    """return num_shares distinct random x values"""
+    x_vals = tuple(set([rand.randint(1, 999999) for _ in range(num_shares)]))
+    for _ in range(num_shares - len(x_vals)):
+        x_vals += (max(x_vals) + 1,)
+    return x_vals
+
+
+def merge_shares(shares: typing.Sequence[Share]) -> typing.Union[int, bytes]:
+    """reconstruct secret as int, or as bytes if split chunk by chunk, from sequence of shares"""
+    threshold = shares[0].n
+    if len(shares) < threshold:
+        raise IndexError(threshold)
+    shares = shares[:threshold]
+    x_vals = [share.x for share in shares]
+    if isinstance(shares[0].y, (tuple, list)):
+        return chunks_to_bytes(interpolate_vectors(x_vals, [share.y for share in shares], chunk_prime))
+    modulus = get_smallest_prime(max([share.y for share in shares]))
+    return interpolate(x_vals, [share.y for share in shares], modulus)
+
+
+def merge_bytes(shares: typing.Sequence[Share]) -> typing.Union[bytes, None]:
+    """reconstruct secret bytes from sequence of shares"""
+    try:
+        secret = merge_shares(shares)
+        return secret if isinstance(secret, bytes) else int_to_bytes(secret)
+    except (IndexError, OverflowError, ValueError):
+        return None
+
+
 def merge(shares: typing.Sequence[typing.Union[Share, typing.Dict]]) -> typing.Union[str, None]:
     """reconstruct secret from sequence of shares"""
-    modulus = get_smallest_prime(max([share.y for share in shares]))
-    threshold = shares[0].n
-    y_intercept = 0
     try:
-        for i in range(threshold):
-            numerator, denominator = 1, 1
-            for j in range(threshold):
-                if i != j:
-                    numerator = (numerator * (0 - shares[j].x)) % modulus
-                    denominator = (denominator * (shares[i].x - shares[j].x)) % modulus
-            lagrange_polynomial = numerator * modulo_inverse(denominator, modulus)
-            y_intercept = (modulus + y_intercept + (shares[i].y * lagrange_polynomial)) % modulus
-        return int_to_str(y_intercept)
-    except (IndexError, UnicodeError):
+        secret = merge_shares(shares)
+        return secret_to_str(secret)
+    except (IndexError, OverflowError, UnicodeError, ValueError):
         return None
 
 
-def split(secret: str, threshold: int, num_shares: int) -> typing.Sequence[Share]:
-    """split secret into shares such that threshold number or more are required to reconstruct"""
-    y_intercept = str_to_int(secret)
+def decode_shares(shares: typing.Sequence[Share]) -> typing.Tuple[typing.Union[int, bytes], typing.Tuple[Share, ...]]:
+    """reconstruct secret as int, or as bytes if split chunk by chunk, from sequence of shares correcting up to
+    (len(shares) - threshold) // 2 faulty shares, and return it with the faulty shares"""
+    threshold = collections.Counter(share.n for share in shares).most_common(1)[0][0]
+    widths = [len(share.y) if isinstance(share.y, (tuple, list)) else 0 for share in shares]
+    width = collections.Counter(widths).most_common(1)[0][0]
+    faulty = tuple(share for share, share_width in zip(shares, widths) if share_width != width)
+    shares = [share for share, share_width in zip(shares, widths) if share_width == width]
+    if len(shares) < threshold:
+        raise IndexError(threshold)
+    x_vals = [share.x for share in shares]
+    if not width:
+        # y values of valid shares are uniformly distributed in the field, so the median lands on its prime
+        modulus = get_smallest_prime(sorted(share.y for share in shares)[len(shares) // 2])
+        secret, indices = decode(x_vals, [share.y for share in shares], threshold, modulus)
+    else:
+        chunks, indices = [], set()
+        for y_vals in zip(*(share.y for share in shares)):
+            chunk, chunk_indices = decode(x_vals, y_vals, threshold, chunk_prime)
+            chunks.append(chunk)
+            indices.update(chunk_indices)
+        if len(indices) > (len(shares) - threshold) // 2:
+            raise ValueError('too many faulty shares to decode')
+        secret = chunks_to_bytes(chunks)
+    return secret, faulty + tuple(shares[i] for i in sorted(indices))
+
+
+def merge_robust(shares: typing.Sequence[Share]) -> typing.Tuple[typing.Union[str, None], typing.Tuple[Share, ...]]:
+    """reconstruct secret from sequence of shares, some of which may be faulty, and return it with the faulty shares"""
+    try:
+        secret, faulty = decode_shares(shares)
+        return secret_to_str(secret), faulty
+    except (IndexError, OverflowError, UnicodeError, ValueError):
+        return None, ()
+
+
+def merge_bytes_robust(shares: typing.Sequence[Share]) -> typing.Tuple[typing.Union[bytes, None],
+                                                                       typing.Tuple[Share, ...]]:
+    """reconstruct secret bytes from sequence of shares, some of which may be faulty, and return it with faulty ones"""
+    try:
+        secret, faulty = decode_shares(shares)
+        return (secret if isinstance(secret, bytes) else int_to_bytes(secret)), faulty
+    except (IndexError, OverflowError, ValueError):
+        return None, ()
+
+
+def split_int(y_intercept: int, threshold: int, num_shares: int) -> typing.Sequence[Share]:
+    """split int into shares over the smallest (mersenne) prime field that holds it"""
+    x_vals = get_x_vals(num_shares)
     modulus = get_smallest_prime(y_intercept)
     coefficients = (y_intercept,) + tuple(map(lambda _: rand.randint(1, modulus - 1), range(threshold - 1)))
-    x_vals = tuple(set([rand.randint(1, 999999) for _ in range(num_shares)]))
-    for _ in range(num_shares - len(x_vals)):
-        x_vals += (max(x_vals) + 1,)
-    return tuple(Share(threshold, num_shares, x, polynomial(x, coefficients, modulus)) for x in x_vals)
+    return tuple(Share(threshold, num_shares, x, y) for x, y in zip(x_vals, evaluate(coefficients, x_vals, modulus)))
+
+
+def split_chunks(secret: bytes, threshold: int, num_shares: int) -> typing.Sequence[Share]:
+    """split bytes into shares chunk by chunk over the field chunk_prime"""
+    x_vals = get_x_vals(num_shares)
+    chunks = bytes_to_chunks(secret)
+    coefficients = (chunks,) + tuple(tuple(rand.randint(1, chunk_prime - 1) for _ in chunks)
+                                     for _ in range(threshold - 1))
+    y_vals = evaluate_vectors(coefficients, x_vals, chunk_prime)
+    return tuple(Share(threshold, num_shares, x, y) for x, y in zip(x_vals, y_vals))
+
+
+def split_bytes(secret: bytes, threshold: int, num_shares: int) -> typing.Sequence[Share]:
+    """split secret bytes into shares such that threshold number or more are required to reconstruct"""
+    if len(secret) > chunked_threshold:
+        return split_chunks(secret, threshold, num_shares)
+    return split_int(bytes_to_int(secret), threshold, num_shares)
+
+
+def split(secret: str, threshold: int, num_shares: int) -> typing.Sequence[Share]:
+    """split secret into shares such that threshold number or more are required to reconstruct"""
+    return split_bytes(secret.encode('utf-8'), threshold, num_shares)
+
+
+def read_full(reader: typing.BinaryIO, size: int) -> bytes:
+    """read size bytes from reader, shorter only at end of stream, as pipes, sockets and raw files may read less"""
+    data = reader.read(size)
+    if len(data) == size or not data:
+        return data
+    data = bytearray(data)
+    while len(data) < size:
+        chunk = reader.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+def split_stream(reader: typing.BinaryIO, threshold: int, num_shares: int) -> typing.Iterator[typing.Tuple[bytes, ...]]:
+    """split secret read from binary stream into share streams, generating per block the bytes for each share stream"""
+    x_vals = get_x_vals(num_shares)
+    yield tuple(stream_header.pack(threshold, num_shares, x) for x in x_vals)
+    block = read_full(reader, stream_block_size)
+    while True:
+        next_block = read_full(reader, stream_block_size) if len(block) == stream_block_size else b''
+        chunks = bytes_to_chunks(block, pad=not next_block)
+        coefficients = (chunks,) + tuple(tuple(rand.randint(1, chunk_prime - 1) for _ in chunks)
+                                         for _ in range(threshold - 1))
+        yield tuple(b''.join(y.to_bytes(stream_element_size, 'big') for y in y_vector)
+                    for y_vector in evaluate_vectors(coefficients, x_vals, chunk_prime))
+        if not next_block:
+            break
+        block = next_block
+
+
+def merge_stream(share_readers: typing.Sequence[typing.BinaryIO]) -> typing.Iterator[bytes]:
+    """reconstruct secret from share streams, generating it in blocks of bounded size"""
+    headers = [stream_header.unpack(read_full(share_reader, stream_header.size)) for share_reader in share_readers]
+    threshold = headers[0][0]
+    if len(share_readers) < threshold:
+        raise IndexError(threshold)
+    if any(n != threshold for n, _, _ in headers):
+        raise ValueError('share streams are not from the same secret')
+    x_vals = [x for _, _, x in headers[:threshold]]
+    read_size = (stream_block_size // chunk_size) * stream_element_size
+    block = b''
+    while True:
+        y_blocks = [read_full(share_reader, read_size) for share_reader in share_readers[:threshold]]
+        if any(len(y_block) != len(y_blocks[0]) for y_block in y_blocks) or len(y_blocks[0]) % stream_element_size:
+            raise ValueError('share streams are truncated or of different lengths')
+        if not y_blocks[0]:
+            break
+        if block:
+            yield block
+        y_vectors = [tuple(int.from_bytes(y_block[i:i + stream_element_size], 'big')
+                           for i in range(0, len(y_block), stream_element_size)) for y_block in y_blocks]
+        chunks = interpolate_vectors(x_vals, y_vectors, chunk_prime)
+        block = b''.join(chunk.to_bytes(chunk_size, 'big') for chunk in chunks)
+    block = block.rstrip(b'\x00')
+    if not block.endswith(b'\x80'):
+        raise ValueError('share streams are truncated, no padding at the end of the secret')
+    yield block[:-1]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#   crypt/store.py:
+#
+########################################################################################################################
+#    Author: Vikas Munshi <vikas.munshi@gmail.com>
+#    Version 0.0.1: 2018.05.24
+#
+#    source: https://github.com/vikasmunshi/python-scripts/tree/master/src/
+#    set-up: bash <(curl -s https://github.com/vikasmunshi/python-scripts/tree/master/src/setup.sh)
+#
+########################################################################################################################
+#    MIT License
+#
+#    Copyright (c) 2018 Vikas Munshi
+#
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+########################################################################################################################
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import typing
+import zlib
+
+try:
+    from .comm import StoreHandlers
+except ImportError:
+    from comm import StoreHandlers
+
+log_magic = b'CLS\x01'
+record_header = struct.Struct('>BHII')  # op, key length, value length, crc32 of key and value
+op_put = 1
+op_delete = 2
+
+
+def write_at(fd: int, data: bytes, offset: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def fsync_dir(path: str) -> None:
+    """make creating or renaming path durable"""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class LogStore(StoreHandlers):
+    """
+    Durable drop in for Store: an append-only log of json values and an in-memory index of key -> position of the
+    value in the log, values are read through a memory map of the log. Startup reads only record headers and keys.
+    A background thread fsyncs all records appended since its previous fsync at once (group commit), writes return
+    once their record is durable unless sync is False. Overwritten and deleted records are dropped by compaction,
+    checked every compact_interval seconds and run once they make up compact_ratio of the log (and compact_min_bytes).
+    """
+
+    def __init__(self, path: str, sync: bool = True, compact_ratio: float = 0.5, compact_min_bytes: int = 1 << 20,
+                 compact_interval: float = 60.0):
+        self.path = path
+        self.sync = sync
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.compact_interval = compact_interval
+        self.lock = threading.Condition()
+        self.index = {}  # key -> (value offset, value length, record length)
+        self.dead_bytes = 0
+        self.appended = 0  # sequence number of the last appended batch of records
+        self.committed = 0  # sequence number of the last fsynced batch
+        self.closed = False
+        self.error = None  # exception that stopped the committer, raised by later writes
+        self.map = None
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.size = os.fstat(self.fd).st_size
+        if self.size == 0:
+            write_at(self.fd, log_magic, 0)
+            os.fsync(self.fd)
+            fsync_dir(path)
+            self.size = len(log_magic)
+        self.remap()
+        if self.map[:len(log_magic)] != log_magic:
+            os.close(self.fd)
+            raise ValueError('{} is not a log store'.format(path))
+        self.replay()
+        self.committer = threading.Thread(target=self.run_commits, daemon=True)
+        self.committer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def remap(self) -> None:
+        if self.map is not None:
+            self.map.close()
+        self.map = mmap.mmap(self.fd, self.size, access=mmap.ACCESS_READ)
+
+    def replay(self) -> None:
+        """rebuild the index from record headers and keys, a torn or corrupt last record is truncated"""
+        offset = len(log_magic)
+        while offset + record_header.size <= self.size:
+            op, key_length, value_length, crc = record_header.unpack_from(self.map, offset)
+            key_offset = offset + record_header.size
+            end = key_offset + key_length + value_length
+            if op not in (op_put, op_delete) or end > self.size:
+                break
+            if end + record_header.size > self.size and zlib.crc32(self.map[key_offset:end]) != crc:
+                break
+            key = self.map[key_offset:key_offset + key_length].decode()
+            self.index_record(op, key, key_offset + key_length, value_length, end - offset)
+            offset = end
+        if offset < self.size:
+            os.ftruncate(self.fd, offset)
+            os.fsync(self.fd)
+            self.size = offset
+            self.remap()
+
+    def index_record(self, op: int, key: str, value_offset: int, value_length: int, record_length: int) -> None:
+        previous = self.index.pop(key, None)
+        if previous is not None:
+            self.dead_bytes += previous[2]
+        if op == op_put:
+            self.index[key] = (value_offset, value_length, record_length)
+        else:
+            self.dead_bytes += record_length
+
+    def append(self, records: typing.Iterable[typing.Tuple[int, str, bytes]]) -> int:
+        """append (op, key, value) records while holding the lock, sequence number to wait for"""
+        chunks = []
+        entries = []
+        offset = self.size
+        for op, key, value in records:
+            key_bytes = key.encode()
+            if len(key_bytes) > 0xffff:
+                raise ValueError('key longer than 65535 bytes')
+            record_length = record_header.size + len(key_bytes) + len(value)
+            chunks.extend((record_header.pack(op, len(key_bytes), len(value), zlib.crc32(key_bytes + value)),
+                           key_bytes, value))
+            entries.append((op, key, offset + record_header.size + len(key_bytes), len(value), record_length))
+            offset += record_length
+        write_at(self.fd, b''.join(chunks), self.size)
+        self.size = offset
+        for entry in entries:
+            self.index_record(*entry)
+        self.appended += 1
+        self.lock.notify_all()
+        return self.appended
+
+    def check_error(self) -> None:
+        if self.error is not None:
+            raise OSError('log store {} stopped committing: {!r}'.format(self.path, self.error)) from self.error
+
+    def wait(self, sequence: int) -> None:
+        """block, while holding the lock, until batch sequence is durable"""
+        while self.committed < sequence:
+            self.check_error()
+            self.lock.wait()
+
+    def run_commits(self) -> None:
+        with self.lock:
+            try:
+                self.commit_until_closed()
+            except BaseException as e:
+                # records appended but not fsynced may be lost (for instance on a full disk), fail the writers
+                self.error = e
+                self.lock.notify_all()
+
+    def commit_until_closed(self) -> None:
+        """commit loop of the committer thread, holding the lock except while fsyncing"""
+        last_check = time.monotonic()
+        while not self.closed:
+            if self.committed == self.appended:
+                self.lock.wait(self.compact_interval)
+                if time.monotonic() - last_check >= self.compact_interval:
+                    last_check = time.monotonic()
+                    if self.committed == self.appended and self.needs_compaction():
+                        self.compact_locked()
+                continue
+            # appends continue while fsync runs and are committed together by the next fsync
+            sequence = self.appended
+            self.lock.release()
+            try:
+                os.fsync(self.fd)
+            finally:
+                self.lock.acquire()
+            self.committed = sequence
+            self.lock.notify_all()
+
+    def needs_compaction(self) -> bool:
+        return self.dead_bytes >= self.compact_min_bytes and self.dead_bytes >= self.compact_ratio * self.size
+
+    def compact(self) -> None:
+        """rewrite the log without overwritten and deleted records"""
+        with self.lock:
+            self.wait(self.appended)
+            self.compact_locked()
+
+    def compact_locked(self) -> None:
+        # only called with no fsync in flight (committed == appended), the committer is the only thread fsyncing
+        if len(self.map) < self.size:
+            self.remap()
+        compact_path = self.path + '.compact'
+        fd = os.open(compact_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            index = {}
+            chunks = [log_magic]
+            written, offset = 0, len(log_magic)
+            for key, (value_offset, value_length, record_length) in self.index.items():
+                start = value_offset + value_length - record_length
+                chunks.append(self.map[start:start + record_length])
+                index[key] = (offset + record_length - value_length, value_length, record_length)
+                offset += record_length
+                if offset - written >= 1 << 20:
+                    write_at(fd, b''.join(chunks), written)
+                    chunks, written = [], offset
+            write_at(fd, b''.join(chunks), written)
+            os.fsync(fd)
+            os.replace(compact_path, self.path)
+        except BaseException:
+            os.close(fd)
+            if os.path.exists(compact_path):
+                os.remove(compact_path)
+            raise
+        # path is the compacted log from here on, switch to it before anything else can fail
+        self.map.close()
+        self.map = None
+        os.close(self.fd)
+        self.fd = fd
+        self.size = offset
+        self.index = index
+        self.dead_bytes = 0
+        self.remap()
+        fsync_dir(self.path)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.lock.notify_all()
+        self.committer.join()
+        with self.lock:
+            try:
+                if self.error is None:
+                    os.fsync(self.fd)
+                    self.committed = self.appended
+            finally:
+                self.lock.notify_all()
+                self.map.close()
+                os.close(self.fd)
+
+    def read(self, key: str) -> bytes:
+        with self.lock:
+            value_offset, value_length, record_length = self.index[key]
+            if value_offset + value_length > len(self.map):
+                self.remap()
+            start = value_offset + value_length - record_length
+            record = self.map[start:value_offset + value_length]
+        op, key_length, value_length, crc = record_header.unpack_from(record)
+        if zlib.crc32(record[record_header.size:]) != crc:
+            raise ValueError('corrupt record for key {} in {}'.format(key, self.path))
+        return record[-value_length:] if value_length else b''
+
+    def write(self, records: typing.List[typing.Tuple[int, str, bytes]]) -> None:
+        with self.lock:
+            self.check_error()
+            sequence = self.append(records)
+            if self.sync:
+                self.wait(sequence)
+
+    def __getitem__(self, key: str) -> typing.Any:
+        return json.loads(self.read(key))
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key: str, value: typing.Any) -> None:
+        self.write([(op_put, key, json.dumps(value).encode())])
+
+    def __delitem__(self, key: str) -> None:
+        with self.lock:
+            if key not in self.index:
+                raise KeyError(key)
+            self.write([(op_delete, key, b'')])
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> typing.Iterator[str]:
+        with self.lock:
+            return iter(list(self.index))
+
+    def keys(self) -> typing.List[str]:
+        with self.lock:
+            return list(self.index)
+
+    def setdefault(self, key: str, value: typing.Any = None) -> typing.Any:
+        return self.setdefault_many({key: value})[key][1]
+
+    def setdefault_many(self, items: dict) -> dict:
+        """setdefault of each item with one durable write, {key: (created, stored value)}"""
+        encoded = {key: json.dumps(value).encode() for key, value in items.items()}
+        with self.lock:
+            created = [key for key in items if key not in self.index]
+            if created:
+                self.write([(op_put, key, encoded[key]) for key in created])
+        created = set(created)
+        return {key: (True, value) if key in created else (False, self.get(key)) for key, value in items.items()}
@@ -15,7 +15,7 @@ setup(
     packages=['crypt'],
     package_dir={'crypt': 'crypt'},
     package_data={'crypt': 'inventory/*.json'},
-    install_requires=['pycryptodome>=3.6.1', 'ifaddr>=0.1.4'],
+    install_requires=['pycryptodome>=3.21.0', 'ifaddr>=0.1.4'],
     license='MIT License',
     platforms=['any'],
     long_description=open('README.md').read()